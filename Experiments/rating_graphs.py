@@ -0,0 +1,76 @@
+import torch
+from torch_geometric.data import Data
+import numpy as np
+import pandas as pd
+
+"""
+dataloader-exp1.py / dataloader-exp2.py 共用的评分图构建方法：两者只在数据集的读取和划分方式上不同。
+"""
+
+
+class RatingGraphMixin:
+    """
+    RatingGraphMixin类为 InMemoryDataset 子类提供评分图的构建与整理。
+    使用前需要在 read_data 中设置 user_index / user_nodes、item_index / item_nodes（由 node_table 生成）
+    以及 user_key_type / item_key_type。
+    """
+
+    def data_2_graphs(self, ratings_df, dataset='train'):
+        """
+        Build the graphs of all ratings of a split at once.
+        Every graph has the nodes [user_id] + user attributes + [item_id] + item attributes, the rows of
+        self.user_nodes / self.item_nodes, so a split is stored as a (num_graphs, node_num) node id matrix.
+        Returns the split and the number of ratings whose user or item is unknown.
+        """
+        num_graphs = ratings_df.shape[0]
+        print(f"Processing [{dataset}]: {num_graphs} ratings")
+
+        user_rows = self.user_index.get_indexer(ratings_df.iloc[:, 0].map(self.user_key_type))
+        item_rows = self.item_index.get_indexer(ratings_df.iloc[:, 1].map(self.item_key_type))
+        keep = (user_rows >= 0) & (item_rows >= 0)
+
+        nodes = np.concatenate([self.user_nodes[user_rows[keep]], self.item_nodes[item_rows[keep]]], axis=1)
+        ratings = ratings_df.iloc[:, 2].to_numpy()[keep].astype(np.int64)
+
+        return {'nodes': nodes, 'rating': ratings}, int(num_graphs - keep.sum())
+
+    def node_table(self, node_dict, id_key):
+        # one row [id] + attributes per user / item, and the index from the dict keys to the rows.
+        keys = list(node_dict.keys())
+        rows = [[node_dict[key][id_key]] + list(node_dict[key]['attribute']) for key in keys]
+        if len({len(row) for row in rows}) > 1:
+            raise ValueError('every {} needs the same number of attributes'.format(id_key))
+        return pd.Index(keys), np.array(rows, dtype=np.int64).reshape(len(keys), -1)
+
+    def edge_templates(self, u_n, i_n):
+        """
+        Edges shared by all graphs with u_n user nodes and i_n item nodes, in the order of to_undirected:
+        inner edges connect every pair of nodes (self loops included) on the same side, outer edges every
+        user node with every item node in both directions.
+        """
+        is_item = np.arange(u_n + i_n) >= u_n
+        inner_edge_index = np.stack(np.nonzero(is_item[:, None] == is_item[None, :]))
+        outer_edge_index = np.stack(np.nonzero(is_item[:, None] != is_item[None, :]))
+        return inner_edge_index, outer_edge_index
+
+    def collate_graphs(self, graphs):
+        """
+        Collate the splits into the InMemoryDataset storage (data, slices) directly. The graphs only differ
+        in their node ids and rating, so the edges are the templates repeated once per graph.
+        """
+        nodes = np.concatenate([split['nodes'] for split in graphs])
+        ratings = np.concatenate([split['rating'] for split in graphs])
+        num_graphs, node_num = nodes.shape
+
+        inner_edge_index, outer_edge_index = self.edge_templates(self.user_nodes.shape[1], self.item_nodes.shape[1])
+        data = Data(x=torch.from_numpy(nodes.reshape(-1, 1)),
+                    edge_index=torch.from_numpy(np.tile(inner_edge_index, num_graphs)),
+                    edge_attr=torch.from_numpy(np.tile(outer_edge_index.T, (num_graphs, 1))),
+                    y=torch.from_numpy(ratings).float())
+
+        steps = torch.arange(num_graphs + 1)
+        slices = {'x': steps * node_num,
+                  'edge_index': steps * inner_edge_index.shape[1],
+                  'edge_attr': steps * outer_edge_index.shape[1],
+                  'y': steps}
+        return data, slices
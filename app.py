@@ -5,14 +5,22 @@ from typing import List, Optional
 # from jose import JWTError, jwt
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import os
+import json
+import asyncio
 import dotenv
+import numpy as np
 
 # 导入自定义模块
-from data_utils.parking_graph_manager import ParkingGraphManager
-from data_utils.parking_graph_query import ParkingGraphQuery
+from data_utils.neo4j_pool import get_async_driver, close_async_drivers
+from data_utils.parking_graph_manager import AsyncParkingGraphManager
+from data_utils.parking_graph_query import AsyncParkingGraphQuery
+from data_utils.user_similarity_index import UserSimilarityIndex
+from data_utils.recommendation_cache import TTLLRUCache
+from data_utils.spatial_index import GridSpatialIndex, parse_location
+from data_utils.spot_snapshot import ParkingSpotSnapshot
 
 app = FastAPI()
 
@@ -25,7 +33,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化 ParkingGraphManager 和 ParkingGraphQuery
+# 初始化 AsyncParkingGraphManager 和 AsyncParkingGraphQuery
 load_status = dotenv.load_dotenv("Neo4j-44cc1206-Created-2024-12-12.txt")
 if load_status is False:
     raise RuntimeError('Environment variables not loaded.')
@@ -33,8 +41,50 @@ if load_status is False:
 URI = os.getenv("NEO4J_URI")
 AUTH = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
 
-parking_graph_manager = ParkingGraphManager(URI, AUTH[0], AUTH[1])
-parking_graph_query = ParkingGraphQuery(URI, AUTH[0], AUTH[1])
+# 如果配置了离线相似度索引（由 data_utils/build_similarity_index.py 生成），推荐时直接查表
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH")
+SIMILARITY_INDEX_REFRESH = float(os.getenv("SIMILARITY_INDEX_REFRESH", "60"))  # 检查索引文件是否更新的间隔（秒）
+similarity_index = None
+similarity_index_task = None
+if SIMILARITY_INDEX_PATH and os.path.exists(SIMILARITY_INDEX_PATH):
+    similarity_index = UserSimilarityIndex.load(SIMILARITY_INDEX_PATH)
+
+# 两者共享同一个异步驱动及其有界连接池，并发吞吐量随连接池大小扩展
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+neo4j_driver = get_async_driver(URI, AUTH[0], AUTH[1], max_connection_pool_size=NEO4J_MAX_POOL_SIZE)
+
+# 推荐结果只在评分、偏好或相似度索引变化时改变，因此缓存推荐结果和停车场节点：偏好更新时按用户失效，
+# 评分写入和相似度索引重新加载时使全部推荐结果失效
+recommendation_cache = TTLLRUCache(maxsize=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+                                   ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "300")))
+
+parking_graph_manager = AsyncParkingGraphManager(neo4j_driver, cache=recommendation_cache)
+parking_graph_query = AsyncParkingGraphQuery(neo4j_driver, similarity_index=similarity_index,
+                                             cache=recommendation_cache)
+
+# 推荐后端：cypher（默认，基于 Neo4j 的用户相似度）或 embedding（基于训练好的 NGCF 嵌入）
+RECOMMENDER_BACKEND = os.getenv("RECOMMENDER_BACKEND", "cypher")
+embedding_recommender = None
+if RECOMMENDER_BACKEND == "embedding":
+    from data_utils.embedding_recommender import EmbeddingRecommender
+
+    embedding_recommender = EmbeddingRecommender.from_checkpoint(
+        os.getenv("NGCF_CHECKPOINT_PATH"),
+        os.getenv("NGCF_ADJ_PATH"),
+        layer_size=os.getenv("NGCF_LAYER_SIZE", "[64,64,64]"),
+        ratings_path=os.getenv("NGCF_RATINGS_PATH"),
+    )
+
+# 停车场坐标的空间索引：按位置推荐时先筛选出附近的停车场，再在候选集中排序
+spatial_index = GridSpatialIndex(cell_size=float(os.getenv("SPATIAL_INDEX_CELL_SIZE", "500")))
+SPATIAL_INDEX_REFRESH = float(os.getenv("SPATIAL_INDEX_REFRESH", "300"))  # 空间索引的刷新间隔（秒）
+SPATIAL_DEFAULT_RADIUS = float(os.getenv("SPATIAL_DEFAULT_RADIUS", "2000"))  # 用户未设置距离偏好时的搜索半径（米）
+spatial_index_task = None
+
+# 停车场属性的列式快照，用于按用户偏好过滤和重排序；排序阶段先取 m * RERANK_POOL_FACTOR 个候选，
+# 应用偏好后再截取前 m 个
+spot_snapshot = ParkingSpotSnapshot()
+RERANK_POOL_FACTOR = int(os.getenv("RERANK_POOL_FACTOR", "4"))
 
 
 # Pydantic 模型定义
@@ -69,6 +119,76 @@ class ParkingRecommendationRequest(BaseModel):
     time: str
 
 
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[int]  # 需要推荐的用户ID列表
+    m: int = 5  # 每个用户返回的推荐停车场数量
+
+
+@app.on_event("startup")
+async def warm_up_queries():
+    # 启动时预先编译全部 Cypher 语句，使执行计划的开销不出现在请求路径上
+    try:
+        await parking_graph_query.warm_up()
+        await parking_graph_manager.warm_up()
+    except Exception as e:
+        print(f"Failed to warm up Cypher queries: {e}")
+
+
+async def refresh_spatial_index():
+    """
+    从数据库重新加载全部停车场坐标和属性，重建空间索引和属性快照
+    """
+    ids, longitudes, latitudes = await parking_graph_query.query_park_locations()
+    spatial_index.rebuild(ids, longitudes, latitudes)
+    spot_snapshot.rebuild(await parking_graph_query.query_park_attributes())
+
+
+async def refresh_spatial_index_periodically():
+    while True:
+        await asyncio.sleep(SPATIAL_INDEX_REFRESH)
+        try:
+            await refresh_spatial_index()
+        except Exception as e:
+            print(f"Failed to refresh the spatial index: {e}")
+
+
+@app.on_event("startup")
+async def load_spatial_index():
+    global spatial_index_task
+    try:
+        await refresh_spatial_index()
+    except Exception as e:
+        print(f"Failed to load the spatial index: {e}")
+    # 停车场会被新增或移动，定期在后台重建索引
+    spatial_index_task = asyncio.create_task(refresh_spatial_index_periodically())
+
+
+async def refresh_similarity_index_periodically():
+    while True:
+        await asyncio.sleep(SIMILARITY_INDEX_REFRESH)
+        try:
+            await parking_graph_query.refresh_similarity_index()
+        except Exception as e:
+            print(f"Failed to refresh the similarity index: {e}")
+
+
+@app.on_event("startup")
+async def watch_similarity_index():
+    global similarity_index_task
+    # 离线任务会重新生成索引文件，在后台定期检查并重新加载，请求路径上只读取内存中的索引
+    if similarity_index is not None:
+        similarity_index_task = asyncio.create_task(refresh_similarity_index_periodically())
+
+
+@app.on_event("shutdown")
+async def close_neo4j_driver():
+    if spatial_index_task is not None:
+        spatial_index_task.cancel()
+    if similarity_index_task is not None:
+        similarity_index_task.cancel()
+    await close_async_drivers()
+
+
 # 挂载静态文件目录，指向 templates 目录下的 assets 文件夹
 app.mount("/assets", StaticFiles(directory="templates/assets"), name="assets")
 
@@ -92,7 +212,7 @@ async def recommendation_results(request: Request):
 # 获取用户偏好
 @app.get("/user/{user_id}")
 async def get_user_preferences(user_id: int):
-    user_node, message = parking_graph_query.query_user_node(user_id)
+    user_node, message = await parking_graph_query.query_user_node(user_id)
     if not user_node:
         raise HTTPException(status_code=404, detail="未找到用户")
 
@@ -112,7 +232,7 @@ async def update_user_preferences(user_id: int, preferences: UserPreferences):
     update_data = preferences.dict()
 
     # 更新用户节点
-    result, message = parking_graph_manager.update_user_node(user_id, update_data)
+    result, message = await parking_graph_manager.update_user_node(user_id, update_data)
     if not result:
         raise HTTPException(status_code=404, detail=message)
 
@@ -122,7 +242,7 @@ async def update_user_preferences(user_id: int, preferences: UserPreferences):
 # 获取停车位信息
 @app.get("/parking/{parking_id}")
 async def get_parking(parking_id: int):
-    parking_node, message = parking_graph_query.query_park_node(parking_id)
+    parking_node, message = await parking_graph_query.query_park_node(parking_id)
     if not parking_node:
         raise HTTPException(status_code=404, detail=message)
     return dict(parking_node)
@@ -137,27 +257,142 @@ async def get_parking(parking_id: int):
 #         raise HTTPException(status_code=404, detail=message)
 #     parking_graph.update_parking_node(parking_id, update_data)
 #     return {"msg": "停车位信息更新成功"}
-#
-#
-# # 获取停车推荐
-# @app.post("/recommendations")
-# async def get_recommendations(request: ParkingRecommendationRequest):
-#     # 这里是添加推荐逻辑的地方
-#     # 为简化起见，我们只是返回所有停车位信息
-#     recommendations = parking_graph.get_all_parking_spots()
-#     if not recommendations:
-#         raise HTTPException(status_code=404, detail="未找到推荐")
-#     return recommendations
+
+
+# 按位置获取停车推荐：只在用户可接受距离内的停车场中推荐
+@app.post("/recommendations")
+async def get_nearby_recommendations(request: ParkingRecommendationRequest):
+    try:
+        longitude, latitude = parse_location(request.location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    user_node, message = await parking_graph_query.query_user_node(request.user_id)
+    if not user_node:
+        raise HTTPException(status_code=404, detail=message)
+
+    # 搜索半径取用户设置的最大步行 / 行车距离中较小的一个
+    limits = [user_node.get(key) for key in ("max_walking_distance", "max_driving_distance")]
+    limits = [float(limit) for limit in limits if limit]
+    radius = min(limits) if limits else SPATIAL_DEFAULT_RADIUS
+
+    candidate_ids, _ = spatial_index.query_radius(longitude, latitude, radius)
+    if len(candidate_ids) == 0:
+        raise HTTPException(status_code=404, detail="附近没有停车场")
+
+    pool = 5 * RERANK_POOL_FACTOR
+    if embedding_recommender is not None and embedding_recommender.has_user(request.user_id):
+        recommendations = await get_embedding_recommendations(request.user_id, m=pool, candidates=candidate_ids)
+    else:
+        recommendations = await parking_graph_query.get_recommendations(request.user_id, m=pool,
+                                                                        candidate_ids=candidate_ids.tolist())
+    recommendations = rerank_by_preferences(recommendations, user_node, m=5)
+    if not recommendations:
+        raise HTTPException(status_code=404, detail="未找到推荐")
+    return recommendations
+
 
 # 获取停车推荐
 @app.get("/recommendations/{user_id}")
 async def get_recommendations(user_id: str):
-    recommendations = parking_graph_query.get_recommendations(user_id)
+    pool = 5 * RERANK_POOL_FACTOR
+    if embedding_recommender is not None and embedding_recommender.has_user(user_id):
+        fetch = get_embedding_recommendations(user_id, m=pool)
+    else:
+        # 未启用嵌入后端，或用户不在训练好的嵌入中（新用户），回退到 Cypher 推荐
+        fetch = parking_graph_query.get_recommendations(user_id, m=pool)
+    # 用户节点通常已在缓存中（偏好更新时失效）；未命中时与推荐查询并发执行，不增加串行的往返
+    recommendations, (user_node, _) = await asyncio.gather(fetch, parking_graph_query.query_user_node(user_id))
+    recommendations = rerank_by_preferences(recommendations, user_node, m=5)
     if not recommendations:
         raise HTTPException(status_code=404, detail="未找到推荐")
     return recommendations
 
 
+# 批量获取停车推荐，以 NDJSON 流的形式逐个用户返回结果
+@app.post("/recommendations/batch")
+async def get_recommendations_batch(request: BatchRecommendationRequest):
+    return StreamingResponse(stream_batch_recommendations(request.user_ids, request.m),
+                             media_type="application/x-ndjson")
+
+
+# 批量推荐时每次查询处理的用户数量，内存占用只与该值有关，而与请求中的用户总数无关
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "500"))
+
+
+async def stream_batch_recommendations(user_ids, m):
+    """
+    分块计算推荐结果：每块只执行一次多用户 Cypher 查询（或一次矩阵乘法），再用一次查询读取这些用户的偏好，
+    与单用户接口一样先取 m * RERANK_POOL_FACTOR 个候选，按偏好重排序后截取前m个，算完即输出
+    """
+    pool = m * RERANK_POOL_FACTOR
+    for start in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+        chunk = user_ids[start: start + BATCH_CHUNK_SIZE]
+
+        results = {}
+        cypher_users = chunk
+        if embedding_recommender is not None:
+            embedding_users = [user_id for user_id in chunk if embedding_recommender.has_user(user_id)]
+            cypher_users = [user_id for user_id in chunk if not embedding_recommender.has_user(user_id)]
+            if embedding_users:
+                results.update(await get_embedding_recommendations_batch(embedding_users, m=pool))
+        if cypher_users:
+            results.update(await parking_graph_query.get_recommendations_batch(cypher_users, m=pool))
+        user_nodes = await parking_graph_query.query_user_nodes(chunk)
+
+        for user_id in chunk:
+            recommendations = rerank_by_preferences(results[user_id], user_nodes.get(user_id), m=m)
+            yield json.dumps({"user_id": user_id, "recommendations": recommendations}, ensure_ascii=False) + "\n"
+
+
+def rerank_by_preferences(recommendations, user_node, m=5):
+    """
+    按用户偏好过滤并重排序推荐结果，取前m个；用户不存在时只截取前m个
+    """
+    if not user_node or not recommendations:
+        return recommendations[:m]
+    positions, _ = spot_snapshot.rerank([recommendation["id"] for recommendation in recommendations],
+                                        [recommendation["grade"] for recommendation in recommendations],
+                                        dict(user_node), m=m)
+    return [recommendations[position] for position in positions.tolist()]
+
+
+# 缓存统计信息，用于评估缓存大小
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return recommendation_cache.stats()
+
+
+async def get_embedding_recommendations(user_id, m=5, candidates=None):
+    """
+    使用 NGCF 嵌入为用户推荐停车场，并补全停车场属性
+    """
+    spot_ids, scores = embedding_recommender.recommend(user_id, m=m, candidates=candidates)
+    spots = await parking_graph_query.query_park_nodes(spot_ids.tolist())
+
+    recommendations = []
+    for spot_id, score in zip(spot_ids.tolist(), scores.tolist()):
+        if spot_id not in spots:
+            continue
+        recommendations.append({**spots[spot_id], "id": spot_id, "grade": score, "num": None})
+    return recommendations
+
+
+async def get_embedding_recommendations_batch(user_ids, m=5):
+    """
+    使用 NGCF 嵌入为多个用户推荐停车场，停车场属性通过一次批量查询补全
+    """
+    spot_ids, scores = embedding_recommender.recommend_batch(user_ids, m=m)
+    spots = await parking_graph_query.query_park_nodes(set(spot_ids[np.isfinite(scores)].tolist()))
+
+    results = {}
+    for user_id, user_spot_ids, user_scores in zip(user_ids, spot_ids.tolist(), scores.tolist()):
+        results[user_id] = [{**spots[spot_id], "id": spot_id, "grade": score, "num": None}
+                            for spot_id, score in zip(user_spot_ids, user_scores)
+                            if spot_id in spots and np.isfinite(score)]
+    return results
+
+
 # 捕获所有未被定义的路由
 @app.get("/{full_path:path}", response_class=HTMLResponse)
 async def catch_all(full_path: str, request: Request):
@@ -0,0 +1,130 @@
+import argparse
+import csv
+import os
+from time import time
+
+import dotenv
+import numpy as np
+from neo4j import GraphDatabase
+
+from user_similarity_index import UserSimilarityIndex
+
+"""
+构建 / 增量更新离线用户相似度索引。
+
+全量构建：
+    python build_similarity_index.py build --output ../data/user_similarity.npz
+增量更新（新评分来自CSV文件，或从数据库重新拉取指定用户的评分）：
+    python build_similarity_index.py update --index ../data/user_similarity.npz --ratings-file new_ratings.csv
+    python build_similarity_index.py update --index ../data/user_similarity.npz --user-ids 12 345
+"""
+
+ALL_RATINGS_QUERY = """
+    MATCH (u:User)-[r:RATED]->(p:ParkingSpot)
+    RETURN u.id AS user_id, p.id AS parking_spot_id, coalesce(r.grade, r.grading) AS grade
+"""
+
+USER_RATINGS_QUERY = """
+    MATCH (u:User)-[r:RATED]->(p:ParkingSpot)
+    WHERE u.id IN $user_ids
+    RETURN u.id AS user_id, p.id AS parking_spot_id, coalesce(r.grade, r.grading) AS grade
+"""
+
+
+def load_ratings_from_csv(file_path):
+    """
+    从评分CSV文件（停车位ID,用户ID,评分）中加载评分数据
+    :param file_path: CSV文件路径
+    :return: (用户ID数组, 停车场ID数组, 评分数组)
+    """
+    user_ids, spot_ids, grades = [], [], []
+    with open(file_path, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            spot_ids.append(int(row['停车位ID']))
+            user_ids.append(int(row['用户ID']))
+            grades.append(float(row['评分']))
+    return np.array(user_ids), np.array(spot_ids), np.array(grades)
+
+
+def load_ratings_from_neo4j(env_file, user_ids=None):
+    """
+    从 Neo4j 数据库中加载评分数据
+    :param env_file: 保存数据库连接信息的环境变量文件
+    :param user_ids: 只加载这些用户的评分，为 None 时加载全部评分
+    :return: (用户ID数组, 停车场ID数组, 评分数组)
+    """
+    if not dotenv.load_dotenv(env_file):
+        raise RuntimeError('Environment variables not loaded.')
+
+    uri = os.getenv("NEO4J_URI")
+    auth = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
+
+    with GraphDatabase.driver(uri, auth=auth) as driver:
+        if user_ids is None:
+            records, _, _ = driver.execute_query(ALL_RATINGS_QUERY)
+        else:
+            records, _, _ = driver.execute_query(USER_RATINGS_QUERY, user_ids=[int(u) for u in user_ids])
+
+    return (np.array([record["user_id"] for record in records], dtype=np.int64),
+            np.array([record["parking_spot_id"] for record in records], dtype=np.int64),
+            np.array([record["grade"] for record in records], dtype=np.float32))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or update the offline user similarity index.")
+    parser.add_argument('--env_file', default="../Neo4j-44cc1206-Created-2024-12-12.txt",
+                        help='File that stores the Neo4j connection settings.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build the index from all ratings.')
+    build_parser.add_argument('--output', default='../data/user_similarity.npz',
+                              help='Output path of the index.')
+    build_parser.add_argument('--ratings-file', default=None,
+                              help='Read ratings from this CSV instead of Neo4j.')
+    build_parser.add_argument('--top-k', type=int, default=10,
+                              help='Number of neighbours kept per user.')
+    build_parser.add_argument('--parking-common', type=int, default=3,
+                              help='Minimum number of co-rated parking spots.')
+    build_parser.add_argument('--threshold-sim', type=float, default=0.9,
+                              help='Minimum cosine similarity.')
+
+    update_parser = subparsers.add_parser('update', help='Apply new ratings to an existing index.')
+    update_parser.add_argument('--index', default='../data/user_similarity.npz',
+                               help='Path of the index to update in place.')
+    source = update_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--ratings-file', default=None,
+                        help='CSV file that contains the new ratings.')
+    source.add_argument('--user-ids', type=int, nargs='+', default=None,
+                        help='Re-read the ratings of these users from Neo4j.')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    t0 = time()
+
+    if args.command == 'build':
+        if args.ratings_file:
+            ratings = load_ratings_from_csv(args.ratings_file)
+        else:
+            ratings = load_ratings_from_neo4j(args.env_file)
+        print(f"Loaded {len(ratings[0])} ratings [{time() - t0:.1f}s]")
+
+        index = UserSimilarityIndex(top_k=args.top_k, parking_common=args.parking_common,
+                                    threshold_sim=args.threshold_sim)
+        index.build(*ratings)
+        index.save(args.output)
+        print(f"Built similarity index for {index.similarity.shape[0]} users, "
+              f"{index.similarity.nnz} neighbour entries -> {args.output} [{time() - t0:.1f}s]")
+    else:
+        index = UserSimilarityIndex.load(args.index)
+        if args.ratings_file:
+            ratings = load_ratings_from_csv(args.ratings_file)
+        else:
+            ratings = load_ratings_from_neo4j(args.env_file, user_ids=args.user_ids)
+
+        affected = index.update(*ratings)
+        index.save(args.index)
+        print(f"Applied {len(ratings[0])} ratings, recomputed {len(affected)} users -> {args.index} "
+              f"[{time() - t0:.1f}s]")
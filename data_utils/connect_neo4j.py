@@ -1,5 +1,8 @@
+import argparse
 import csv
+import json
 import os
+from time import time
 import dotenv
 from neo4j import GraphDatabase
 from tqdm import tqdm  # 导入 tqdm 库
@@ -16,6 +19,12 @@ AUTH = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
 # 创建驱动程序实例
 driver = GraphDatabase.driver(URI, auth=AUTH)
 
+# 唯一性约束（同时创建索引），保证批量 MERGE 按索引查找节点
+CONSTRAINT_QUERIES = [
+    "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+    "CREATE CONSTRAINT parking_spot_id_unique IF NOT EXISTS FOR (p:ParkingSpot) REQUIRE p.id IS UNIQUE",
+]
+
 
 def load_parking_spots(file_path):
     """
@@ -61,53 +70,147 @@ def load_ratings(file_path):
     return ratings
 
 
+def create_constraints(session):
+    """
+    在导入数据之前为 User.id 和 ParkingSpot.id 创建唯一性约束（同时会建立索引），
+    使批量导入中的 MERGE 能够按索引查找节点，而不是扫描全部节点。
+    :param session: 数据库会话
+    """
+    for query in CONSTRAINT_QUERIES:
+        session.run(query).consume()
+
+
 def insert_parking_spots(tx, parking_spots):
     """
-    将停车位数据插入到数据库中。
+    将一批停车位数据插入到数据库中。
     :param tx: 数据库事务
     :param parking_spots: 停车位的数据列表
     """
-    for spot in tqdm(parking_spots, desc="Inserting Parking Spots", unit="spot"):  # 使用 tqdm 显示进度条
-        tx.run("""
-            MERGE (p:ParkingSpot {id: $id})
-            SET p.driving_distance = $driving_distance,
-                p.walking_distance = $walking_distance,
-                p.found_time = $found_time,
-                p.parking_space_size = $parking_space_size,
-                p.parking_difficulty = $parking_difficulty,
-                p.near_elevator = $near_elevator,
-                p.has_surveillance = $has_surveillance,
-                p.fee = $fee,
-                p.parking_type = $parking_type,
-                p.longitude = $longitude,
-                p.latitude = $latitude
-        """, **spot)
+    tx.run("""
+        UNWIND $rows AS row
+        MERGE (p:ParkingSpot {id: row.id})
+        SET p.driving_distance = row.driving_distance,
+            p.walking_distance = row.walking_distance,
+            p.found_time = row.found_time,
+            p.parking_space_size = row.parking_space_size,
+            p.parking_difficulty = row.parking_difficulty,
+            p.near_elevator = row.near_elevator,
+            p.has_surveillance = row.has_surveillance,
+            p.fee = row.fee,
+            p.parking_type = row.parking_type,
+            p.longitude = row.longitude,
+            p.latitude = row.latitude
+    """, rows=parking_spots).consume()
 
 
 def insert_ratings(tx, ratings):
     """
-    将评分数据插入到数据库中，创建用户与停车位之间的 RATED 关系。
+    将一批评分数据插入到数据库中，创建用户与停车位之间的 RATED 关系。
     :param tx: 数据库事务
     :param ratings: 用户对停车位评分的数据列表
     """
-    for rating in tqdm(ratings, desc="Inserting User Ratings", unit="rating"):  # 使用 tqdm 显示进度条
-        tx.run("""
-            MERGE (u:User {id: $user_id})
-            MERGE (p:ParkingSpot {id: $parking_spot_id})
-            MERGE (u)-[r:RATED]->(p)
-            SET r.grade = $grade
-        """, **rating)
+    tx.run("""
+        UNWIND $rows AS row
+        MERGE (u:User {id: row.user_id})
+        MERGE (p:ParkingSpot {id: row.parking_spot_id})
+        MERGE (u)-[r:RATED]->(p)
+        SET r.grade = row.grade
+    """, rows=ratings).consume()
+
+
+def source_signature(file_path):
+    """
+    数据文件的标识（绝对路径、大小、修改时间），断点只对同一份文件有效
+    """
+    stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_checkpoint(checkpoint_file):
+    """
+    读取断点文件，返回每类数据的断点 {名称: {'source': 数据文件标识, 'rows': 已经提交的行数}}
+    """
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
 
 
-def insert_data_into_neo4j(parking_spots_file, ratings_file):
+def save_checkpoint(checkpoint_file, checkpoint):
+    """
+    保存断点文件（先写临时文件再替换，避免中断时写坏断点）
     """
-    从文件中读取数据并插入到 Neo4j 数据库。
+    if not checkpoint_file:
+        return
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def remove_checkpoint(checkpoint_file):
+    """
+    全部数据导入完成后删除断点文件，避免之后重新生成的数据被误跳过
+    """
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
+def insert_in_batches(session, insert_func, rows, name, source, batch_size, checkpoint, checkpoint_file):
+    """
+    按批次插入数据，每个批次单独提交一个事务，并在提交后记录断点。
+    失败后重新运行会从最后一个已提交的批次之后继续；数据文件变化后断点失效，从头导入。
+    :param session: 数据库会话
+    :param insert_func: 插入一批数据的事务函数
+    :param rows: 全部数据
+    :param name: 数据类别名称，同时作为断点文件中的键
+    :param source: 数据文件标识（source_signature 的返回值）
+    :param batch_size: 每批的行数
+    :param checkpoint: 断点字典，记录每类数据的文件标识和已经提交的行数
+    :param checkpoint_file: 断点文件路径，为 None 时不记录断点
+    :return: 本次插入的行数
+    """
+    entry = checkpoint.get(name)
+    start = 0
+    if isinstance(entry, dict) and entry.get('source') == source:
+        start = entry['rows']
+    elif entry is not None:
+        print(f"{name}: {source['path']} changed since the checkpoint was written, loading it from the start.")
+    if start >= len(rows):
+        print(f"{name}: all {len(rows)} rows already committed, skipping.")
+        return 0
+    if start > 0:
+        print(f"{name}: resuming from row {start}.")
+
+    t0 = time()
+    with tqdm(total=len(rows), initial=start, desc=f"Inserting {name}", unit="row") as pbar:
+        for offset in range(start, len(rows), batch_size):
+            batch = rows[offset: offset + batch_size]
+            session.execute_write(insert_func, batch)
+
+            checkpoint[name] = {'source': source, 'rows': offset + len(batch)}
+            save_checkpoint(checkpoint_file, checkpoint)
+            pbar.update(len(batch))
+            pbar.set_postfix(rows_per_sec=f"{(offset + len(batch) - start) / max(time() - t0, 1e-9):.0f}")
+
+    inserted = len(rows) - start
+    elapsed = time() - t0
+    print(f"{name}: inserted {inserted} rows in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):.0f} rows/sec).")
+    return inserted
+
+
+def insert_data_into_neo4j(parking_spots_file, ratings_file, batch_size=10000, checkpoint_file=None):
+    """
+    从文件中读取数据并分批插入到 Neo4j 数据库。
     :param parking_spots_file: 停车位的 CSV 文件路径
     :param ratings_file: 用户对停车位的评分 CSV 文件路径
+    :param batch_size: 每个事务提交的行数
+    :param checkpoint_file: 断点文件路径，用于失败后继续导入
     """
     # 读取数据
     parking_spots = load_parking_spots(parking_spots_file)
     ratings = load_ratings(ratings_file)
+    checkpoint = load_checkpoint(checkpoint_file)
 
     try:
         with driver.session() as session:
@@ -115,25 +218,46 @@ def insert_data_into_neo4j(parking_spots_file, ratings_file):
             driver.verify_connectivity()
             print("Connection established.")
 
+            create_constraints(session)
+
             # 插入停车场数据
-            session.execute_write(insert_parking_spots, parking_spots)
-            print(f"Inserted {len(parking_spots)} parking spots.")
+            insert_in_batches(session, insert_parking_spots, parking_spots, 'parking_spots',
+                              source_signature(parking_spots_file), batch_size, checkpoint, checkpoint_file)
 
             # 插入用户评分关系
-            session.execute_write(insert_ratings, ratings)
-            print(f"Inserted {len(ratings)} ratings.")
+            insert_in_batches(session, insert_ratings, ratings, 'ratings',
+                              source_signature(ratings_file), batch_size, checkpoint, checkpoint_file)
+
+            # 全部导入完成，断点不再需要
+            remove_checkpoint(checkpoint_file)
 
     except Exception as e:
         print(f"Failed to insert data into Neo4j: {e}")
+        if checkpoint_file:
+            print(f"Progress saved to {checkpoint_file}, rerun to resume.")
     finally:
         # 关闭驱动程序
         driver.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load parking spots and ratings into Neo4j.")
     # CSV 文件路径
-    parking_spots_file = "../data/parking_spots_with_coords.csv"
-    ratings_file = "../data/original_ratings_old.csv"
+    parser.add_argument('--parking_spots_file', default="../data/parking_spots_with_coords.csv",
+                        help='Parking spots CSV file.')
+    parser.add_argument('--ratings_file', default="../data/original_ratings_old.csv",
+                        help='Ratings CSV file.')
+    parser.add_argument('--batch_size', type=int, default=10000,
+                        help='Rows per UNWIND batch (one transaction per batch).')
+    parser.add_argument('--checkpoint_file', default="../data/neo4j_load.checkpoint.json",
+                        help='File that records committed rows so a failed load can be resumed.')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore an existing checkpoint and load everything again.')
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint_file):
+        os.remove(args.checkpoint_file)
 
     # 插入数据到 Neo4j
-    insert_data_into_neo4j(parking_spots_file, ratings_file)
+    insert_data_into_neo4j(args.parking_spots_file, args.ratings_file, batch_size=args.batch_size,
+                           checkpoint_file=args.checkpoint_file)
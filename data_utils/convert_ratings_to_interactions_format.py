@@ -43,7 +43,7 @@ class ParkingDataConverter:
             # 定义在Neo4j中的Cypher查询
             query = """
             MATCH (u:User)-[r:RATED]->(p:ParkingSpot)
-            RETURN u.id AS user_id, p.id AS parking_spot_id, r.grading AS rating
+            RETURN u.id AS user_id, p.id AS parking_spot_id, coalesce(r.grade, r.grading) AS rating
             """
 
             # 执行查询并获取结果
@@ -0,0 +1,308 @@
+from neo4j import RoutingControl
+
+"""
+ParkingGraphQuery 和 ParkingGraphManager（以及对应的异步版本）使用的全部 Cypher 语句。
+所有语句都通过 $参数 传值，语句文本固定不变，因此 Neo4j 可以复用缓存的执行计划，也不存在注入风险。
+"""
+
+# ---------------------------------------------------------------------------
+# 查询
+# ---------------------------------------------------------------------------
+
+PARK_NODE_QUERY = """
+    MATCH (p:ParkingSpot {id: $park_id})
+    RETURN p
+    LIMIT 1
+"""
+
+PARK_NODES_QUERY = """
+    MATCH (p:ParkingSpot)
+    WHERE p.id IN $park_ids
+    RETURN p.id AS id, p AS node
+"""
+
+USER_NODE_QUERY = """
+    MATCH (u:User {id: $user_id})
+    RETURN u
+    LIMIT 1
+"""
+
+USER_NODES_QUERY = """
+    MATCH (u:User)
+    WHERE u.id IN $user_ids
+    RETURN u.id AS id, u AS node
+"""
+
+# 全部停车场的坐标，用于构建空间索引
+PARK_LOCATIONS_QUERY = """
+    MATCH (p:ParkingSpot)
+    WHERE p.longitude IS NOT NULL AND p.latitude IS NOT NULL
+    RETURN p.id AS id, p.longitude AS longitude, p.latitude AS latitude
+"""
+
+# 全部停车场用于偏好过滤和重排序的属性
+PARK_ATTRIBUTES_QUERY = """
+    MATCH (p:ParkingSpot)
+    RETURN p.id AS id, p.fee AS fee, p.parking_type AS parking_type, p.parking_difficulty AS parking_difficulty,
+           p.walking_distance AS walking_distance, p.driving_distance AS driving_distance
+"""
+
+# 推荐查询：在同一条只读查询中计算目标用户与其他用户的余弦相似度，取前k个相似用户，
+# 再根据相似用户的评分加权得到推荐结果。不写入 SIMILARITY 关系，
+# 避免并发请求之间的写锁竞争以及互相覆盖相似度结果。
+RECOMMENDATION_QUERY = """
+    MATCH (u1:User {id: $user_id})-[r1:RATED]-(p:ParkingSpot)-[r2:RATED]-(u2:User)
+    WITH
+        u2,
+        COUNT(p) AS parking_common,
+        SUM(r1.grade * r2.grade)/(SQRT(SUM(r1.grade^2)) * SQRT(SUM(r2.grade^2))) AS sim
+    WHERE parking_common >= $parking_common AND sim > $threshold_sim
+    WITH u2, sim
+    ORDER BY sim DESC LIMIT $k
+    MATCH (p:ParkingSpot)-[r:RATED]-(u2)
+    WITH
+        p.id AS id,
+        p.driving_distance AS driving_distance,
+        p.walking_distance AS walking_distance,
+        p.found_time AS found_time,
+        p.parking_space_size AS parking_space_size,
+        p.parking_difficulty AS parking_difficulty,
+        p.near_elevator AS near_elevator,
+        p.has_surveillance AS has_surveillance,
+        p.fee AS fee,
+        p.parking_type AS parking_type,
+        p.longitude AS longitude,
+        p.latitude AS latitude,
+        SUM(r.grade * sim)/SUM(sim) AS grade,
+        COUNT(u2) AS num
+    WHERE num >= $users_common
+    RETURN id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
+    ORDER BY grade DESC, num DESC
+    LIMIT $m
+"""
+
+# 附近停车场的推荐查询：从候选停车场（空间索引筛选出的附近停车场）出发，只与评价过这些停车场的用户计算相似度，
+# 再只对候选停车场评分，查询的工作量与附近停车场的评分数量成正比，而不是与整个图的规模成正比
+NEARBY_RECOMMENDATION_QUERY = """
+    MATCH (u1:User {id: $user_id})
+    MATCH (c:ParkingSpot)-[:RATED]-(u2:User)
+    WHERE c.id IN $candidate_ids AND u2 <> u1
+    WITH DISTINCT u1, u2
+    MATCH (u1)-[r1:RATED]-(p:ParkingSpot)-[r2:RATED]-(u2)
+    WITH
+        u2,
+        COUNT(p) AS parking_common,
+        SUM(r1.grade * r2.grade)/(SQRT(SUM(r1.grade^2)) * SQRT(SUM(r2.grade^2))) AS sim
+    WHERE parking_common >= $parking_common AND sim > $threshold_sim
+    WITH u2, sim
+    ORDER BY sim DESC LIMIT $k
+    MATCH (p:ParkingSpot)-[r:RATED]-(u2)
+    WHERE p.id IN $candidate_ids
+    WITH
+        p.id AS id,
+        p.driving_distance AS driving_distance,
+        p.walking_distance AS walking_distance,
+        p.found_time AS found_time,
+        p.parking_space_size AS parking_space_size,
+        p.parking_difficulty AS parking_difficulty,
+        p.near_elevator AS near_elevator,
+        p.has_surveillance AS has_surveillance,
+        p.fee AS fee,
+        p.parking_type AS parking_type,
+        p.longitude AS longitude,
+        p.latitude AS latitude,
+        SUM(r.grade * sim)/SUM(sim) AS grade,
+        COUNT(u2) AS num
+    WHERE num >= $users_common
+    RETURN id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
+    ORDER BY grade DESC, num DESC
+    LIMIT $m
+"""
+
+# 基于离线相似度索引的推荐查询：相似用户及相似度由调用方传入
+INDEX_RECOMMENDATION_QUERY = """
+    UNWIND $neighbors AS neighbor
+    MATCH (u2:User {id: neighbor.id})-[r:RATED]-(p:ParkingSpot)
+    WHERE $candidate_ids IS NULL OR p.id IN $candidate_ids
+    WITH
+        p.id AS id,
+        p.driving_distance AS driving_distance,
+        p.walking_distance AS walking_distance,
+        p.found_time AS found_time,
+        p.parking_space_size AS parking_space_size,
+        p.parking_difficulty AS parking_difficulty,
+        p.near_elevator AS near_elevator,
+        p.has_surveillance AS has_surveillance,
+        p.fee AS fee,
+        p.parking_type AS parking_type,
+        p.longitude AS longitude,
+        p.latitude AS latitude,
+        SUM(r.grade * neighbor.sim)/SUM(neighbor.sim) AS grade,
+        COUNT(u2) AS num
+    WHERE num >= $users_common
+    RETURN id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
+    ORDER BY grade DESC, num DESC
+    LIMIT $m
+"""
+
+# 多用户推荐查询：对 $user_ids 中的每个用户执行与 RECOMMENDATION_QUERY 相同的计算，
+# 一次往返返回全部用户的推荐结果（每行带有 user_id）
+BATCH_RECOMMENDATION_QUERY = """
+    UNWIND $user_ids AS uid
+    CALL {
+        WITH uid
+        MATCH (u1:User {id: uid})-[r1:RATED]-(p:ParkingSpot)-[r2:RATED]-(u2:User)
+        WITH
+            u2,
+            COUNT(p) AS parking_common,
+            SUM(r1.grade * r2.grade)/(SQRT(SUM(r1.grade^2)) * SQRT(SUM(r2.grade^2))) AS sim
+        WHERE parking_common >= $parking_common AND sim > $threshold_sim
+        WITH u2, sim
+        ORDER BY sim DESC LIMIT $k
+        MATCH (p:ParkingSpot)-[r:RATED]-(u2)
+        WITH
+            p.id AS id,
+            p.driving_distance AS driving_distance,
+            p.walking_distance AS walking_distance,
+            p.found_time AS found_time,
+            p.parking_space_size AS parking_space_size,
+            p.parking_difficulty AS parking_difficulty,
+            p.near_elevator AS near_elevator,
+            p.has_surveillance AS has_surveillance,
+            p.fee AS fee,
+            p.parking_type AS parking_type,
+            p.longitude AS longitude,
+            p.latitude AS latitude,
+            SUM(r.grade * sim)/SUM(sim) AS grade,
+            COUNT(u2) AS num
+        WHERE num >= $users_common
+        RETURN id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
+        ORDER BY grade DESC, num DESC
+        LIMIT $m
+    }
+    RETURN uid AS user_id, id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
+"""
+
+# 基于离线相似度索引的多用户推荐查询：$users 中每个元素为 {id, neighbors: [{id, sim}, ...]}
+BATCH_INDEX_RECOMMENDATION_QUERY = """
+    UNWIND $users AS user
+    CALL {
+        WITH user
+        UNWIND user.neighbors AS neighbor
+        MATCH (u2:User {id: neighbor.id})-[r:RATED]-(p:ParkingSpot)
+        WITH
+            p.id AS id,
+            p.driving_distance AS driving_distance,
+            p.walking_distance AS walking_distance,
+            p.found_time AS found_time,
+            p.parking_space_size AS parking_space_size,
+            p.parking_difficulty AS parking_difficulty,
+            p.near_elevator AS near_elevator,
+            p.has_surveillance AS has_surveillance,
+            p.fee AS fee,
+            p.parking_type AS parking_type,
+            p.longitude AS longitude,
+            p.latitude AS latitude,
+            SUM(r.grade * neighbor.sim)/SUM(neighbor.sim) AS grade,
+            COUNT(u2) AS num
+        WHERE num >= $users_common
+        RETURN id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
+        ORDER BY grade DESC, num DESC
+        LIMIT $m
+    }
+    RETURN user.id AS user_id, id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
+"""
+
+# ---------------------------------------------------------------------------
+# 写入
+# ---------------------------------------------------------------------------
+
+CREATE_PARKING_NODE_QUERY = """
+    OPTIONAL MATCH (existing:ParkingSpot {id: $id})
+    WITH existing
+    WHERE existing IS NULL
+    CREATE (p:ParkingSpot)
+    SET p = $props
+    RETURN p
+"""
+
+CREATE_USER_NODE_QUERY = """
+    OPTIONAL MATCH (existing:User {id: $id})
+    WITH existing
+    WHERE existing IS NULL
+    CREATE (u:User {id: $id})
+    RETURN u
+"""
+
+CREATE_RATING_RELATION_QUERY = """
+    MATCH (u:User {id: $user_id})
+    MATCH (p:ParkingSpot {id: $park_id})
+    CREATE (u)-[r:RATED {grade: $grading}]->(p)
+    RETURN count(r) AS created
+"""
+
+# 批量创建评分关系：每个元素为 {user_id, park_id, grading}
+CREATE_RATING_RELATIONS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (u:User {id: row.user_id})
+    MATCH (p:ParkingSpot {id: row.park_id})
+    CREATE (u)-[r:RATED {grade: row.grading}]->(p)
+    RETURN count(r) AS created
+"""
+
+UPDATE_USER_NODE_QUERY = """
+    MATCH (u:User {id: $user_id})
+    SET u += $props
+    RETURN u
+"""
+
+# 语句名称 -> (语句, 路由方式, 预热时使用的示例参数)
+QUERIES = {
+    'park_node': (PARK_NODE_QUERY, RoutingControl.READ, {'park_id': 0}),
+    'park_nodes': (PARK_NODES_QUERY, RoutingControl.READ, {'park_ids': []}),
+    'user_node': (USER_NODE_QUERY, RoutingControl.READ, {'user_id': 0}),
+    'user_nodes': (USER_NODES_QUERY, RoutingControl.READ, {'user_ids': []}),
+    'park_locations': (PARK_LOCATIONS_QUERY, RoutingControl.READ, {}),
+    'park_attributes': (PARK_ATTRIBUTES_QUERY, RoutingControl.READ, {}),
+    'recommendation': (RECOMMENDATION_QUERY, RoutingControl.READ,
+                       {'user_id': 0, 'k': 10, 'parking_common': 3, 'users_common': 2, 'threshold_sim': 0.9, 'm': 5}),
+    'nearby_recommendation': (NEARBY_RECOMMENDATION_QUERY, RoutingControl.READ,
+                              {'user_id': 0, 'k': 10, 'parking_common': 3, 'users_common': 2, 'threshold_sim': 0.9,
+                               'm': 5, 'candidate_ids': []}),
+    'index_recommendation': (INDEX_RECOMMENDATION_QUERY, RoutingControl.READ,
+                             {'neighbors': [], 'users_common': 2, 'm': 5, 'candidate_ids': None}),
+    'batch_recommendation': (BATCH_RECOMMENDATION_QUERY, RoutingControl.READ,
+                             {'user_ids': [], 'k': 10, 'parking_common': 3, 'users_common': 2, 'threshold_sim': 0.9,
+                              'm': 5}),
+    'batch_index_recommendation': (BATCH_INDEX_RECOMMENDATION_QUERY, RoutingControl.READ,
+                                   {'users': [], 'users_common': 2, 'm': 5}),
+    'create_parking_node': (CREATE_PARKING_NODE_QUERY, RoutingControl.WRITE, {'id': 0, 'props': {}}),
+    'create_user_node': (CREATE_USER_NODE_QUERY, RoutingControl.WRITE, {'id': 0}),
+    'create_rating_relation': (CREATE_RATING_RELATION_QUERY, RoutingControl.WRITE,
+                               {'user_id': 0, 'park_id': 0, 'grading': 0.}),
+    'create_rating_relations': (CREATE_RATING_RELATIONS_QUERY, RoutingControl.WRITE, {'rows': []}),
+    'update_user_node': (UPDATE_USER_NODE_QUERY, RoutingControl.WRITE, {'user_id': 0, 'props': {}}),
+}
+
+
+def warm_up(graph, names=None):
+    """
+    使用 EXPLAIN 预先编译语句，使执行计划进入 Neo4j 的查询缓存（不会真正执行语句）
+    :param graph: py2neo.Graph对象
+    :param names: 需要预热的语句名称列表，为 None 时预热全部语句
+    """
+    for name in names or QUERIES:
+        query, _, params = QUERIES[name]
+        graph.run('EXPLAIN ' + query, **params)
+
+
+async def async_warm_up(driver, names=None, database=None):
+    """
+    warm_up 的异步版本
+    :param driver: neo4j.AsyncDriver对象
+    :param names: 需要预热的语句名称列表，为 None 时预热全部语句
+    :param database: 数据库名称，为 None 时使用默认数据库
+    """
+    for name in names or QUERIES:
+        query, routing, params = QUERIES[name]
+        await driver.execute_query('EXPLAIN ' + query, params, routing_=routing, database_=database)
@@ -0,0 +1,152 @@
+import csv
+from types import SimpleNamespace
+
+import numpy as np
+import scipy.sparse as sp
+import torch
+
+from model.NGCF import NGCF
+
+"""
+基于 NGCF 最终嵌入的进程内推荐引擎：启动时加载训练好的模型并完成一次图传播，
+之后每个请求只需在内存中做一次向量化的点积 top-m 搜索。
+"""
+
+
+class EmbeddingRecommender:
+    """
+    EmbeddingRecommender类使用用户/停车场的最终嵌入计算推荐结果，并屏蔽用户已经评过分的停车场。
+    用户和停车场的嵌入下标即为数据库中的 User.id 和 ParkingSpot.id。
+    """
+
+    def __init__(self, user_embeddings, item_embeddings, rated):
+        """
+        :param user_embeddings: 用户最终嵌入，形状为 (n_users, d)
+        :param item_embeddings: 停车场最终嵌入，形状为 (n_items, d)
+        :param rated: 用户 × 停车场 的CSR矩阵，非零位置表示用户已评分，推荐时会被屏蔽
+        """
+        self.user_embeddings = np.ascontiguousarray(user_embeddings, dtype=np.float32)
+        self.item_embeddings = np.ascontiguousarray(item_embeddings, dtype=np.float32)
+        self.n_users, self.n_items = self.user_embeddings.shape[0], self.item_embeddings.shape[0]
+
+        rated = sp.csr_matrix(rated, dtype=np.float32)
+        rated.resize((self.n_users, self.n_items))
+        self.rated = rated
+
+        # 训练数据中从未出现过的停车场（例如未使用的ID）嵌入没有意义，不参与推荐
+        self.unknown_items = np.asarray(rated.getnnz(axis=0) == 0)
+        # 同理，没有任何训练交互的用户（例如未使用的ID）嵌入只是随机初始化的结果，不视为已知用户
+        self.known_users = np.asarray(rated.getnnz(axis=1) > 0)
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint_path, adj_path, layer_size='[64,64,64]', ratings_path=None):
+        """
+        从 NGCF 训练保存的权重文件中加载模型，并计算最终的用户/停车场嵌入
+        :param checkpoint_path: model/main.py 保存的 state_dict 文件路径
+        :param adj_path: 训练时使用的归一化邻接矩阵（s_norm_adj_mat.npz）路径
+        :param layer_size: 训练时的 --layer_size 参数
+        :param ratings_path: 评分CSV文件（停车位ID,用户ID,评分），用于屏蔽已评分的停车场；
+                             为 None 时使用邻接矩阵中的训练交互
+        :return: EmbeddingRecommender对象
+        """
+        state_dict = torch.load(checkpoint_path, map_location='cpu')
+        n_users, emb_size = state_dict['embedding_dict.user_emb'].shape
+        n_items = state_dict['embedding_dict.item_emb'].shape[0]
+        norm_adj = sp.load_npz(adj_path).tocsr()
+
+        args = SimpleNamespace(device=torch.device('cpu'), embed_size=emb_size, batch_size=1,
+                               node_dropout=[0.], mess_dropout=[0.] * len(eval(layer_size)),
+                               layer_size=layer_size, regs='[0.]')
+        model = NGCF(n_users, n_items, norm_adj, args)
+        model.load_state_dict(state_dict)
+        model.eval()
+
+        with torch.no_grad():
+            user_embeddings, item_embeddings, _ = model(range(n_users), range(n_items), [], drop_flag=False)
+
+        if ratings_path is None:
+            rated = norm_adj[:n_users, n_users:]
+        else:
+            rated = cls.load_rated_from_csv(ratings_path, (n_users, n_items))
+
+        return cls(user_embeddings.numpy(), item_embeddings.numpy(), rated)
+
+    @staticmethod
+    def load_rated_from_csv(file_path, shape):
+        """
+        从评分CSV文件中读取用户已评分的停车场
+        :param file_path: CSV文件路径
+        :param shape: (n_users, n_items)
+        :return: 用户 × 停车场 的CSR矩阵
+        """
+        user_ids, spot_ids = [], []
+        with open(file_path, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                user_ids.append(int(row['用户ID']))
+                spot_ids.append(int(row['停车位ID']))
+        user_ids, spot_ids = np.array(user_ids), np.array(spot_ids)
+        keep = (user_ids < shape[0]) & (spot_ids < shape[1])
+        return sp.csr_matrix((np.ones(keep.sum(), dtype=np.float32), (user_ids[keep], spot_ids[keep])), shape=shape)
+
+    def has_user(self, user_id):
+        """
+        判断用户是否在训练好的嵌入中，且在训练数据中有过交互
+        """
+        user_id = int(user_id)
+        return 0 <= user_id < self.n_users and bool(self.known_users[user_id])
+
+    def recommend(self, user_id, m=5, candidates=None):
+        """
+        为用户推荐得分最高的m个未评分停车场
+        :param user_id: 用户ID
+        :param m: 返回的推荐停车场数量
+        :param candidates: 候选停车场ID数组（例如空间索引筛选出的附近停车场），为 None 时在全部停车场中推荐；
+                           指定候选集时只计算候选停车场的得分
+        :return: (停车场ID数组, 得分数组)，按得分降序排列
+        """
+        user_id = int(user_id)
+        user_rated = self.rated.indices[self.rated.indptr[user_id]:self.rated.indptr[user_id + 1]]
+        if candidates is None:
+            items = np.arange(self.n_items)
+            scores = self.item_embeddings @ self.user_embeddings[user_id]
+            scores[self.unknown_items] = -np.inf
+            scores[user_rated] = -np.inf
+        else:
+            items = np.asarray(candidates, dtype=np.int64)
+            items = items[(items >= 0) & (items < self.n_items)]
+            scores = self.item_embeddings[items] @ self.user_embeddings[user_id]
+            scores[self.unknown_items[items] | np.isin(items, user_rated)] = -np.inf
+
+        m = min(int(m), len(items))
+        if m <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, m - 1)[:m]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[np.isfinite(scores[top])]
+        return items[top], scores[top]
+
+    def recommend_batch(self, user_ids, m=5):
+        """
+        通过一次矩阵乘法为多个用户推荐得分最高的m个未评分停车场
+        :param user_ids: 用户ID数组（必须都在训练好的嵌入的ID范围内）
+        :param m: 每个用户返回的推荐停车场数量
+        :return: (停车场ID矩阵, 得分矩阵)，形状均为 (len(user_ids), m)，每行按得分降序排列；
+                 可推荐的停车场不足m个时，多余位置的得分为 -inf；没有训练交互的用户整行得分均为 -inf
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        scores = self.user_embeddings[user_ids] @ self.item_embeddings.T
+        scores[:, self.unknown_items] = -np.inf
+        scores[~self.known_users[user_ids]] = -np.inf
+
+        rated = self.rated[user_ids]
+        rows = np.repeat(np.arange(len(user_ids)), np.diff(rated.indptr))
+        scores[rows, rated.indices] = -np.inf
+
+        m = min(int(m), self.n_items)
+        if m <= 0:
+            return np.empty((len(user_ids), 0), dtype=np.int64), np.empty((len(user_ids), 0), dtype=np.float32)
+        top = np.argpartition(-scores, m - 1, axis=1)[:, :m]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
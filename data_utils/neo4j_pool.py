@@ -0,0 +1,40 @@
+from neo4j import AsyncGraphDatabase
+
+"""
+共享的 Neo4j 异步驱动：同一进程内的 AsyncParkingGraphQuery 和 AsyncParkingGraphManager
+使用同一个驱动及其有界连接池，而不是各自建立连接。
+"""
+
+_drivers = {}
+
+
+def get_async_driver(uri, username, password, max_connection_pool_size=50, connection_acquisition_timeout=30.0):
+    """
+    获取（必要时创建）共享的异步驱动
+    :param uri: 数据库URI
+    :param username: 数据库用户名
+    :param password: 数据库密码
+    :param max_connection_pool_size: 连接池中的最大连接数，决定了可同时执行的查询数量
+    :param connection_acquisition_timeout: 等待空闲连接的最长时间（秒）
+    :return: neo4j.AsyncDriver对象
+    """
+    key = (uri, username)
+    driver = _drivers.get(key)
+    if driver is None:
+        try:
+            driver = AsyncGraphDatabase.driver(uri, auth=(username, password),
+                                               max_connection_pool_size=max_connection_pool_size,
+                                               connection_acquisition_timeout=connection_acquisition_timeout)
+        except Exception as e:
+            raise ConnectionError(f"数据库连接失败: {str(e)}")
+        _drivers[key] = driver
+    return driver
+
+
+async def close_async_drivers():
+    """
+    关闭所有共享的异步驱动（应用退出时调用）
+    """
+    while _drivers:
+        _, driver = _drivers.popitem()
+        await driver.close()
@@ -1,26 +1,83 @@
-from py2neo import Graph, Node, Relationship, NodeMatcher
+from py2neo import Graph
+from neo4j import RoutingControl
 import csv
 
+from data_utils.recommendation_cache import user_tag, RECOMMENDATIONS_TAG
+from data_utils.cypher_queries import (PARK_NODE_QUERY, USER_NODE_QUERY, CREATE_PARKING_NODE_QUERY,
+                                       CREATE_USER_NODE_QUERY, CREATE_RATING_RELATION_QUERY, CREATE_RATING_RELATIONS_QUERY,
+                                       UPDATE_USER_NODE_QUERY,
+                                       warm_up, async_warm_up)
+
 """
 负责与停车场和用户节点的创建、关系的创建和更新相关的功能
 """
 
+MANAGER_QUERY_NAMES = ['park_node', 'user_node', 'create_parking_node', 'create_user_node',
+                       'create_rating_relation', 'create_rating_relations', 'update_user_node']
+
+
+def invalidate_user(cache, user_id):
+    """
+    用户的偏好发生变化时，删除缓存中该用户的全部条目
+    """
+    if cache is not None:
+        cache.invalidate_tag(user_tag(user_id))
+
+
+def invalidate_recommendations(cache):
+    """
+    写入评分后删除缓存中全部用户的推荐结果：评分会通过共同的相似用户影响其他用户的推荐
+    """
+    if cache is not None:
+        cache.invalidate_tag(RECOMMENDATIONS_TAG)
+
+
+def rating_relation_rows(attrs_list):
+    """
+    将评分关系属性列表转换为批量语句的参数
+    :param attrs_list: 关系属性列表的列表，每项为 [停车场ID, 用户ID, 评分]
+    """
+    return [{'park_id': int(attrs[0]), 'user_id': int(attrs[1]), 'grading': float(attrs[2])} for attrs in attrs_list]
+
+
+def parking_node_props(attrs):
+    """
+    将停车场属性列表转换为节点属性字典
+    :param attrs: 节点属性列表
+    :return: 节点属性字典
+    """
+    return {
+        'id': int(attrs[0]),  # ID
+        'driving_distance': int(attrs[1]),  # Driving Distance (meters)
+        'walking_distance': int(attrs[2]),  # Walking Distance (meters)
+        'found_time': int(attrs[3]),  # Time to Find Parking (minutes)
+        'parking_space_size': int(attrs[4]),  # Parking Space Size (0-10)
+        'parking_difficulty': attrs[5],  # Parking Difficulty
+        'near_elevator': attrs[6],  # Near Elevator
+        'has_surveillance': attrs[7],  # Has Surveillance
+        'fee': float(attrs[8]),  # Parking Fee (CNY/hour)
+        'parking_type': attrs[9],  # Parking Type
+        'longitude': float(attrs[10]),  # Longitude
+        'latitude': float(attrs[11]),  # Latitude
+    }
+
 
 class ParkingGraphManager:
     """
     ParkingGraphManager类负责管理停车场和用户节点的创建、更新以及关系的创建。
     """
 
-    def __init__(self, uri, username, password):
+    def __init__(self, uri, username, password, cache=None):
         """
         初始化数据库连接
         :param uri: 数据库URI
         :param username: 数据库用户名
         :param password: 数据库密码
+        :param cache: ParkingGraphQuery 使用的缓存（TTLLRUCache），写入评分时使全部推荐结果失效，用户偏好变化时使该用户的条目失效
         """
+        self.cache = cache
         try:
             self.graph = Graph(uri, auth=(username, password))
-            self.node_matcher = NodeMatcher(self.graph)
             print("Connected to the database.")
         except Exception as e:
             raise ConnectionError(f"Failed to connect to the database: {str(e)}")
@@ -41,6 +98,12 @@ class ParkingGraphManager:
         except Exception as e:
             raise Exception(f"An error occurred while reading the file: {str(e)}")
 
+    def warm_up(self):
+        """
+        预热本类使用的全部语句的执行计划
+        """
+        warm_up(self.graph, MANAGER_QUERY_NAMES)
+
     def create_parking_node(self, attrs):
         """
         创建停车场节点，如果节点不存在则创建
@@ -48,26 +111,8 @@ class ParkingGraphManager:
         :return: 创建的节点或者None
         """
         try:
-            # 检查停车场节点是否存在
-            re_value = self.node_matcher.match('ParkingSpot').where(id=int(attrs[0])).first()
-            if re_value is None:
-                # 创建停车场节点，映射新的属性
-                node = Node('ParkingSpot',
-                            id=int(attrs[0]),  # ID
-                            driving_distance=int(attrs[1]),  # Driving Distance (meters)
-                            walking_distance=int(attrs[2]),  # Walking Distance (meters)
-                            found_time=int(attrs[3]),  # Time to Find Parking (minutes)
-                            parking_space_size=int(attrs[4]),  # Parking Space Size (0-10)
-                            parking_difficulty=attrs[5],  # Parking Difficulty
-                            near_elevator=attrs[6],  # Near Elevator
-                            has_surveillance=attrs[7],  # Has Surveillance
-                            fee=float(attrs[8]),  # Parking Fee (CNY/hour)
-                            parking_type=attrs[9],  # Parking Type
-                            longitude=float(attrs[10]),  # Longitude
-                            latitude=float(attrs[11]))  # Latitude
-                self.graph.create(node)
-                return node
-            return None
+            props = parking_node_props(attrs)
+            return self.graph.run(CREATE_PARKING_NODE_QUERY, id=props['id'], props=props).evaluate()
         except Exception as e:
             raise Exception(f"Failed to create parking node: {str(e)}")
 
@@ -78,12 +123,7 @@ class ParkingGraphManager:
         :return: 创建的用户节点或者None
         """
         try:
-            re_value = self.node_matcher.match('User').where(id=int(attrs[1])).first()
-            if re_value is None:
-                node = Node('User', id=int(attrs[1]))
-                self.graph.create(node)
-                return node
-            return None
+            return self.graph.run(CREATE_USER_NODE_QUERY, id=int(attrs[1])).evaluate()
         except Exception as e:
             raise Exception(f"Failed to create user node: {str(e)}")
 
@@ -94,16 +134,30 @@ class ParkingGraphManager:
         :return: 创建结果和对应的消息
         """
         try:
-            park_value = self.match_park_node(attrs)
-            user_value = self.match_user_node(attrs)
-            if park_value is None or user_value is None:
+            # 匹配节点与创建关系在同一条语句中完成，只需一次数据库往返
+            created = self.graph.run(CREATE_RATING_RELATION_QUERY, park_id=int(attrs[0]), user_id=int(attrs[1]),
+                                     grading=float(attrs[2])).evaluate()
+            if not created:
                 return False, "Either ParkingSpot or User node not found."
-            relation = Relationship(user_value, 'RATED', park_value, grading=float(attrs[2]))
-            self.graph.create(relation)
+            invalidate_recommendations(self.cache)
             return True, "Rating relation created successfully."
         except Exception as e:
             raise Exception(f"Failed to create rating relation: {str(e)}")
 
+    def create_rating_relations(self, attrs_list):
+        """
+        在一条 UNWIND 语句中批量创建评分关系
+        :param attrs_list: 关系属性列表的列表
+        :return: 创建的关系数量
+        """
+        try:
+            rows = rating_relation_rows(attrs_list)
+            created = self.graph.run(CREATE_RATING_RELATIONS_QUERY, rows=rows).evaluate()
+            invalidate_recommendations(self.cache)
+            return created or 0
+        except Exception as e:
+            raise Exception(f"Failed to create rating relations: {str(e)}")
+
     def match_park_node(self, attrs):
         """
         匹配停车场节点
@@ -111,7 +165,7 @@ class ParkingGraphManager:
         :return: 匹配的停车场节点
         """
         try:
-            return self.node_matcher.match('ParkingSpot').where(id=int(attrs[0])).first()
+            return self.graph.run(PARK_NODE_QUERY, park_id=int(attrs[0])).evaluate()
         except Exception as e:
             raise Exception(f"Failed to match parking spot: {str(e)}")
 
@@ -122,7 +176,7 @@ class ParkingGraphManager:
         :return: 匹配的用户节点
         """
         try:
-            return self.node_matcher.match('User').where(id=int(attrs[1])).first()
+            return self.graph.run(USER_NODE_QUERY, user_id=int(attrs[1])).evaluate()
         except Exception as e:
             raise Exception(f"Failed to match user: {str(e)}")
 
@@ -134,15 +188,11 @@ class ParkingGraphManager:
         :return: 更新结果和对应的消息
         """
         try:
-
-            user_node, error_message = self.query_user_node(user_id)
+            user_id = int(user_id)
+            user_node = self.graph.run(UPDATE_USER_NODE_QUERY, user_id=user_id, props=dict(update_data)).evaluate()
             if not user_node:
-                return None, error_message
-
-            for key, value in update_data.items():
-                user_node[key] = value
-
-            self.graph.push(user_node)
+                return None, f"未找到ID为 {user_id} 的用户节点。"
+            invalidate_user(self.cache, user_id)
             return True, "User updated successfully."
         except Exception as e:
             raise Exception(f"Failed to update user node: {str(e)}")
@@ -156,10 +206,125 @@ class ParkingGraphManager:
         try:
             user_id = int(user_id)
             # 尝试从数据库中查询用户节点
-            find_node = self.node_matcher.match('User', id=user_id).first()
+            find_node = self.graph.run(USER_NODE_QUERY, user_id=user_id).evaluate()
             if find_node:
                 return find_node, None  # 返回节点对象
             else:
                 return None, f"未找到ID为 {user_id} 的用户节点。"  # 没有找到节点
         except Exception as e:
             raise Exception(f"查询用户节点失败: {str(e)}")
+
+
+class AsyncParkingGraphManager:
+    """
+    AsyncParkingGraphManager类是ParkingGraphManager的异步版本，基于官方 neo4j AsyncDriver。
+    可以与 AsyncParkingGraphQuery 共享同一个驱动（及其连接池）。
+    """
+
+    def __init__(self, driver, database=None, cache=None):
+        """
+        :param driver: neo4j.AsyncDriver对象，通常由 neo4j_pool.get_async_driver 获取
+        :param database: 数据库名称，为 None 时使用默认数据库
+        :param cache: AsyncParkingGraphQuery 使用的缓存（TTLLRUCache），写入评分时使全部推荐结果失效，用户偏好变化时使该用户的条目失效
+        """
+        self.driver = driver
+        self.database = database
+        self.cache = cache
+
+    async def warm_up(self):
+        """
+        预热本类使用的全部语句的执行计划
+        """
+        await async_warm_up(self.driver, MANAGER_QUERY_NAMES, database=self.database)
+
+    async def _run(self, query, routing=RoutingControl.WRITE, **params):
+        records, _, _ = await self.driver.execute_query(query, params, routing_=routing, database_=self.database)
+        return records
+
+    async def create_parking_node(self, attrs):
+        """
+        创建停车场节点，如果节点不存在则创建
+        :param attrs: 节点属性列表
+        :return: 创建的节点或者None
+        """
+        try:
+            props = parking_node_props(attrs)
+            records = await self._run(CREATE_PARKING_NODE_QUERY, id=props['id'], props=props)
+            return records[0]["p"] if records else None
+        except Exception as e:
+            raise Exception(f"Failed to create parking node: {str(e)}")
+
+    async def create_user_node(self, attrs):
+        """
+        创建用户节点
+        :param attrs: 用户节点属性列表
+        :return: 创建的用户节点或者None
+        """
+        try:
+            records = await self._run(CREATE_USER_NODE_QUERY, id=int(attrs[1]))
+            return records[0]["u"] if records else None
+        except Exception as e:
+            raise Exception(f"Failed to create user node: {str(e)}")
+
+    async def create_rating_relation(self, attrs):
+        """
+        为用户和停车场创建评分关系
+        :param attrs: 关系属性列表
+        :return: 创建结果和对应的消息
+        """
+        try:
+            records = await self._run(CREATE_RATING_RELATION_QUERY, park_id=int(attrs[0]), user_id=int(attrs[1]),
+                                      grading=float(attrs[2]))
+            if not records or records[0]["created"] == 0:
+                return False, "Either ParkingSpot or User node not found."
+            invalidate_recommendations(self.cache)
+            return True, "Rating relation created successfully."
+        except Exception as e:
+            raise Exception(f"Failed to create rating relation: {str(e)}")
+
+    async def create_rating_relations(self, attrs_list):
+        """
+        在一条 UNWIND 语句中批量创建评分关系
+        :param attrs_list: 关系属性列表的列表
+        :return: 创建的关系数量
+        """
+        try:
+            rows = rating_relation_rows(attrs_list)
+            records = await self._run(CREATE_RATING_RELATIONS_QUERY, rows=rows)
+            invalidate_recommendations(self.cache)
+            return records[0]["created"] if records else 0
+        except Exception as e:
+            raise Exception(f"Failed to create rating relations: {str(e)}")
+
+    async def update_user_node(self, user_id, update_data):
+        """
+        更新用户节点
+        :param user_id: 用户ID
+        :param update_data: 需要更新的数据（字典形式）
+        :return: 更新结果和对应的消息
+        """
+        try:
+            user_id = int(user_id)
+            records = await self._run(UPDATE_USER_NODE_QUERY, user_id=user_id, props=dict(update_data))
+            if not records:
+                return None, f"未找到ID为 {user_id} 的用户节点。"
+            invalidate_user(self.cache, user_id)
+            return True, "User updated successfully."
+        except Exception as e:
+            raise Exception(f"Failed to update user node: {str(e)}")
+
+    async def query_user_node(self, user_id):
+        """
+        查询用户节点
+        :param user_id: 用户的ID
+        :return: 匹配的用户节点，如果未找到则返回消息
+        """
+        try:
+            user_id = int(user_id)
+            records = await self._run(USER_NODE_QUERY, routing=RoutingControl.READ, user_id=user_id)
+            if records:
+                return records[0]["u"], None
+            else:
+                return None, f"未找到ID为 {user_id} 的用户节点。"
+        except Exception as e:
+            raise Exception(f"查询用户节点失败: {str(e)}")
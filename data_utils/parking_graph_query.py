@@ -1,5 +1,124 @@
-from py2neo import Graph, NodeMatcher
+import asyncio
+
+from py2neo import Graph
+import numpy as np
 import pandas as pd
+from neo4j import RoutingControl
+
+from data_utils.cypher_queries import (PARK_NODE_QUERY, PARK_NODES_QUERY, USER_NODE_QUERY, USER_NODES_QUERY,
+                                       PARK_LOCATIONS_QUERY,
+                                       PARK_ATTRIBUTES_QUERY, RECOMMENDATION_QUERY, NEARBY_RECOMMENDATION_QUERY,
+                                       INDEX_RECOMMENDATION_QUERY,
+                                       BATCH_RECOMMENDATION_QUERY, BATCH_INDEX_RECOMMENDATION_QUERY, warm_up,
+                                       async_warm_up)
+from data_utils.recommendation_cache import user_tag, RECOMMENDATIONS_TAG
+
+RECOMMENDATION_QUERY_NAMES = ['park_node', 'park_nodes', 'user_node', 'user_nodes', 'park_locations', 'park_attributes',
+                              'recommendation', 'nearby_recommendation', 'index_recommendation', 'batch_recommendation',
+                              'batch_index_recommendation']
+
+
+def recommendations_cache_key(user_id, k, parking_common, users_common, threshold_sim, m):
+    """
+    推荐结果的缓存键：用户ID加上全部请求参数
+    """
+    return ('recommendations', int(user_id), int(k), int(parking_common), int(users_common), float(threshold_sim),
+            int(m))
+
+
+def park_locations(records):
+    """
+    将停车场坐标查询结果转换为 (ID数组, 经度数组, 纬度数组)，用于重建空间索引
+    """
+    ids = np.array([record["id"] for record in records], dtype=np.int64)
+    longitudes = np.array([record["longitude"] for record in records], dtype=np.float64)
+    latitudes = np.array([record["latitude"] for record in records], dtype=np.float64)
+    return ids, longitudes, latitudes
+
+
+def recommendations_tags(user_id):
+    """
+    推荐结果缓存项的标签
+    """
+    return user_tag(user_id), RECOMMENDATIONS_TAG
+
+
+def batch_cache_lookup(cache, user_ids, *params):
+    """
+    从缓存中读取多个用户已有的推荐结果
+    :param cache: 缓存对象，可以为 None
+    :param user_ids: 用户ID列表
+    :param params: 推荐参数 (k, parking_common, users_common, threshold_sim, m)
+    :return: (已命中的结果字典, 未命中的用户ID列表)
+    """
+    results, misses = {}, []
+    for user_id in dict.fromkeys(user_ids):
+        if cache is not None:
+            hit, recommendations = cache.get(recommendations_cache_key(user_id, *params))
+            if hit:
+                results[user_id] = recommendations
+                continue
+        misses.append(user_id)
+    return results, misses
+
+
+def cached_user_nodes(cache, user_ids):
+    """
+    从缓存中读取多个用户节点（与 query_user_node 共用缓存项）
+    :return: (已命中的 {用户ID: 节点}, 未命中的用户ID列表, 查询之前读取的缓存代数)
+    """
+    user_ids = [int(user_id) for user_id in user_ids]
+    if cache is None:
+        return {}, user_ids, None
+
+    nodes, misses = {}, []
+    generation = cache.generation()
+    for user_id in user_ids:
+        hit, node = cache.get(('user', user_id))
+        if hit:
+            nodes[user_id] = node
+        else:
+            misses.append(user_id)
+    return nodes, misses, generation
+
+
+def cache_user_nodes(cache, generation, nodes, records):
+    """
+    把批量查询到的用户节点写入结果字典和缓存
+    """
+    for record in records:
+        nodes[record["id"]] = record["node"]
+        if cache is not None:
+            cache.set(('user', record["id"]), record["node"], tags=(user_tag(record["id"]),), generation=generation)
+
+
+def batch_neighbors(similarity_index, user_ids, k, threshold_sim):
+    """
+    从离线相似度索引中读取多个用户的相似用户，没有相似用户的用户不参与查询
+    """
+    users = []
+    for user_id in user_ids:
+        neighbors = similarity_index.neighbors(user_id, k=int(k), threshold_sim=float(threshold_sim))
+        if neighbors:
+            users.append({'id': user_id, 'neighbors': neighbors})
+    return users
+
+
+def batch_collect(cache, generation, results, user_ids, records, *params):
+    """
+    按 user_id 对多用户查询的结果分组，写入结果字典和缓存
+    :param generation: 查询之前读取的缓存代数
+    """
+    grouped = {user_id: [] for user_id in user_ids}
+    for record in records:
+        grouped[record["user_id"]].append(record)
+
+    for user_id, user_records in grouped.items():
+        recommendations = ParkingGraphQuery._format_recommendations(user_records)
+        results[user_id] = recommendations
+        if cache is not None:
+            cache.set(recommendations_cache_key(user_id, *params), recommendations, tags=recommendations_tags(user_id),
+                      generation=generation)
 
 
 class ParkingGraphQuery:
@@ -7,20 +126,42 @@ class ParkingGraphQuery:
     ParkingGraphQuery类负责查询数据库中的节点信息，并提供基于用户评分的推荐功能。
     """
 
-    def __init__(self, uri, username, password):
+    def __init__(self, uri, username, password, similarity_index=None, cache=None):
         """
         初始化数据库连接
         :param uri: 数据库URI
         :param username: 数据库用户名
         :param password: 数据库密码
+        :param similarity_index: 离线构建的用户相似度索引（UserSimilarityIndex），为 None 时在查询中实时计算相似度
+        :param cache: 推荐结果与停车场节点的缓存（TTLLRUCache），为 None 时不使用缓存
         """
+        self.similarity_index = similarity_index
+        self.cache = cache
         try:
             self.graph = Graph(uri, auth=(username, password))
-            self.node_matcher = NodeMatcher(self.graph)
             print("Connected to the database.")
         except Exception as e:
             raise ConnectionError(f"数据库连接失败: {str(e)}")
 
+    def warm_up(self):
+        """
+        预热本类使用的全部查询语句的执行计划
+        """
+        warm_up(self.graph, RECOMMENDATION_QUERY_NAMES)
+
+    def refresh_similarity_index(self):
+        """
+        如果离线任务更新了磁盘上的相似度索引文件，则重新加载，并使缓存中的全部推荐结果失效
+        :return: 是否重新加载
+        """
+        if self.similarity_index is None:
+            return False
+        reloaded = self.similarity_index.refresh()
+        if reloaded and self.cache is not None:
+            # 相似用户变化后，所有基于旧索引的推荐结果都已过期
+            self.cache.invalidate_tag(RECOMMENDATIONS_TAG)
+        return reloaded
+
     def query_park_node(self, park_id):
         """
         查询停车场节点
@@ -29,15 +170,57 @@ class ParkingGraphQuery:
         """
         try:
             park_id = int(park_id)
+            generation = None
+            if self.cache is not None:
+                hit, find_node = self.cache.get(('park', park_id))
+                if hit:
+                    return find_node, None
+                generation = self.cache.generation()
+
             # 尝试从数据库中查询停车场节点
-            find_node = self.node_matcher.match('ParkingSpot').where(id=park_id).first()
+            find_node = self.graph.run(PARK_NODE_QUERY, park_id=park_id).evaluate()
             if find_node:
+                if self.cache is not None:
+                    self.cache.set(('park', park_id), find_node, generation=generation)
                 return find_node, None  # 返回节点对象
             else:
                 return None, f"未找到ID为 {park_id} 的停车场节点。"  # 没有找到节点
         except Exception as e:
             raise Exception(f"查询停车场节点失败: {str(e)}")
 
+    def query_park_nodes(self, park_ids):
+        """
+        批量查询停车场节点
+        :param park_ids: 停车场ID列表
+        :return: 字典，键为停车场ID，值为停车场属性字典
+        """
+        try:
+            park_ids = [int(park_id) for park_id in park_ids]
+            result = self.graph.run(PARK_NODES_QUERY, park_ids=park_ids)
+            return {record["id"]: dict(record["node"]) for record in result}
+        except Exception as e:
+            raise Exception(f"批量查询停车场节点失败: {str(e)}")
+
+    def query_park_locations(self):
+        """
+        查询全部停车场的坐标
+        :return: (停车场ID数组, 经度数组, 纬度数组)
+        """
+        try:
+            return park_locations(self.graph.run(PARK_LOCATIONS_QUERY))
+        except Exception as e:
+            raise Exception(f"查询停车场坐标失败: {str(e)}")
+
+    def query_park_attributes(self):
+        """
+        查询全部停车场用于偏好过滤的属性
+        :return: 停车场属性字典列表
+        """
+        try:
+            return [dict(record) for record in self.graph.run(PARK_ATTRIBUTES_QUERY)]
+        except Exception as e:
+            raise Exception(f"查询停车场属性失败: {str(e)}")
+
     def query_user_node(self, user_id):
         """
         查询用户节点
@@ -46,16 +229,41 @@ class ParkingGraphQuery:
         """
         try:
             user_id = int(user_id)
+            generation = None
+            if self.cache is not None:
+                hit, find_node = self.cache.get(('user', user_id))
+                if hit:
+                    return find_node, None
+                generation = self.cache.generation()
+
             # 尝试从数据库中查询用户节点
-            find_node = self.node_matcher.match('User', id=user_id).first()
+            find_node = self.graph.run(USER_NODE_QUERY, user_id=user_id).evaluate()
             if find_node:
+                if self.cache is not None:
+                    # 用户偏好更新时按 user_tag 失效
+                    self.cache.set(('user', user_id), find_node, tags=(user_tag(user_id),), generation=generation)
                 return find_node, None  # 返回节点对象
             else:
                 return None, f"未找到ID为 {user_id} 的用户节点。"  # 没有找到节点
         except Exception as e:
             raise Exception(f"查询用户节点失败: {str(e)}")
 
-    def get_recommendations(self, user_id, k=10, parking_common=3, users_common=2, threshold_sim=0.9, m=5):
+    def query_user_nodes(self, user_ids):
+        """
+        批量查询用户节点
+        :param user_ids: 用户ID列表
+        :return: 字典，键为用户ID，值为用户属性字典；不存在的用户不出现在字典中
+        """
+        try:
+            nodes, misses, generation = cached_user_nodes(self.cache, user_ids)
+            if misses:
+                cache_user_nodes(self.cache, generation, nodes, self.graph.run(USER_NODES_QUERY, user_ids=misses))
+            return {user_id: dict(node) for user_id, node in nodes.items()}
+        except Exception as e:
+            raise Exception(f"批量查询用户节点失败: {str(e)}")
+
+    def get_recommendations(self, user_id, k=10, parking_common=3, users_common=2, threshold_sim=0.9, m=5,
+                            candidate_ids=None):
         """
         基于用户相似性获取停车场推荐列表
 
@@ -65,81 +273,323 @@ class ParkingGraphQuery:
         :param users_common: 被推荐的停车场至少要被几名相似用户打分
         :param threshold_sim: 用户相似度的最小阈值
         :param m: 返回的推荐停车场数量
+        :param candidate_ids: 候选停车场ID列表（例如附近的停车场），为 None 时在全部停车场中推荐；
+                              指定候选集时相似用户只在评价过候选停车场的用户中选取，结果随位置变化，不写入缓存
 
         :return: 推荐的停车场列表（包含停车场的评分和相似用户的数量）
         """
         try:
-            # 1. 清除已有的用户相似性关系
+            self.refresh_similarity_index()
             user_id = int(user_id)
-            self.graph.run(f"""
-                MATCH (u1:User)-[s:SIMILARITY]-(u2:User)
-                DELETE s
-            """)
-
-            # 2. 计算所有用户之间的余弦相似度，并创建相似性关系
-            self.graph.run(f"""
-                MATCH (u1:User {{id : {user_id}}})-[r1:RATED]-(p:ParkingSpot)-[r2:RATED]-(u2:User)
-                WITH
-                    u1, u2,
-                    COUNT(p) AS parking_common,
-                    SUM(r1.grade * r2.grade)/(SQRT(SUM(r1.grade^2)) * SQRT(SUM(r2.grade^2))) AS sim
-                WHERE parking_common >= {parking_common} AND sim > {threshold_sim}
-                MERGE (u1)-[s:SIMILARITY]-(u2)
-                SET s.sim = sim
-            """)
-
-            # 3. 根据相似度获取推荐的停车场
-            query = f"""
-                MATCH (u1:User {{id : {user_id}}})-[s:SIMILARITY]-(u2:User)
-                WITH u1, u2, s
-                ORDER BY s.sim DESC LIMIT {k}
-                MATCH (p:ParkingSpot)-[r:RATED]-(u2)
-                WITH u1, u2, s, p, r
-                WITH
-                    p.id AS id,
-                    p.driving_distance AS driving_distance,
-                    p.walking_distance AS walking_distance,
-                    p.found_time AS found_time,
-                    p.parking_space_size AS parking_space_size,
-                    p.parking_difficulty AS parking_difficulty,
-                    p.near_elevator AS near_elevator,
-                    p.has_surveillance AS has_surveillance,
-                    p.fee AS fee,
-                    p.parking_type AS parking_type,
-                    p.longitude AS longitude,
-                    p.latitude AS latitude,
-                    SUM(r.grade * s.sim)/SUM(s.sim) AS grade,
-                    COUNT(u2) AS num
-                WHERE num >= {users_common}
-                RETURN id, driving_distance, walking_distance, found_time, parking_space_size, parking_difficulty, near_elevator, has_surveillance, fee, parking_type, longitude, latitude, grade, num
-                ORDER BY grade DESC, num DESC
-                LIMIT {m}
-            """
-
-            # 执行查询并获取推荐结果
-            result = self.graph.run(query)
-            recommendations = []
-
-            # 将查询结果转换为字典列表
-            for record in result:
-                recommendations.append({
-                    "id": record["id"],
-                    "driving_distance": record["driving_distance"],
-                    "walking_distance": record["walking_distance"],
-                    "found_time": record["found_time"],
-                    "parking_space_size": record["parking_space_size"],
-                    "parking_difficulty": record["parking_difficulty"],
-                    "near_elevator": record["near_elevator"],
-                    "has_surveillance": record["has_surveillance"],
-                    "fee": record["fee"],
-                    "parking_type": record["parking_type"],
-                    "longitude": record["longitude"],
-                    "latitude": record["latitude"],
-                    "grade": record["grade"],
-                    "num": record["num"],
-                })
+            cache_key = recommendations_cache_key(user_id, k, parking_common, users_common, threshold_sim, m)
+            use_cache = self.cache is not None and candidate_ids is None
+            if candidate_ids is not None:
+                candidate_ids = [int(park_id) for park_id in candidate_ids]
+            if use_cache:
+                hit, recommendations = self.cache.get(cache_key)
+                if hit:
+                    return recommendations
+                # 查询期间发生的失效会使本次结果不被写入缓存
+                generation = self.cache.generation()
 
+            if self.similarity_index is not None:
+                recommendations = self._get_recommendations_from_index(user_id, k, users_common, threshold_sim, m,
+                                                                       candidate_ids)
+            elif candidate_ids is not None:
+                # 从候选停车场出发查询，只与评价过附近停车场的用户计算相似度
+                result = self.graph.run(NEARBY_RECOMMENDATION_QUERY, user_id=user_id, k=int(k),
+                                        parking_common=int(parking_common), users_common=int(users_common),
+                                        threshold_sim=float(threshold_sim), m=int(m),
+                                        candidate_ids=candidate_ids)
+                recommendations = self._format_recommendations(result)
+            else:
+                # 执行查询并获取推荐结果
+                result = self.graph.run(RECOMMENDATION_QUERY, user_id=user_id, k=int(k),
+                                        parking_common=int(parking_common), users_common=int(users_common),
+                                        threshold_sim=float(threshold_sim), m=int(m))
+                recommendations = self._format_recommendations(result)
+
+            if use_cache:
+                self.cache.set(cache_key, recommendations, tags=recommendations_tags(user_id), generation=generation)
             return recommendations
 
         except Exception as e:
-            raise Exception(f"获取推荐停车场失败: {str(e)}")
\ No newline at end of file
+            raise Exception(f"获取推荐停车场失败: {str(e)}")
+
+    def _get_recommendations_from_index(self, user_id, k, users_common, threshold_sim, m, candidate_ids=None):
+        """
+        从离线相似度索引中读取前k个相似用户，再根据其评分加权得到推荐结果
+        """
+        neighbors = self.similarity_index.neighbors(user_id, k=int(k), threshold_sim=float(threshold_sim))
+        if not neighbors:
+            return []
+
+        result = self.graph.run(INDEX_RECOMMENDATION_QUERY, neighbors=neighbors, users_common=int(users_common), m=int(m),
+                                candidate_ids=candidate_ids)
+        return self._format_recommendations(result)
+
+    def get_recommendations_batch(self, user_ids, k=10, parking_common=3, users_common=2, threshold_sim=0.9, m=5):
+        """
+        在一次查询中为多个用户获取停车场推荐列表，参数含义与 get_recommendations 相同
+        :param user_ids: 用户ID列表
+        :return: 字典，键为用户ID，值为该用户的推荐列表（顺序与 user_ids 一致）
+        """
+        try:
+            self.refresh_similarity_index()
+            user_ids = [int(user_id) for user_id in user_ids]
+            params = (k, parking_common, users_common, threshold_sim, m)
+            results, misses = batch_cache_lookup(self.cache, user_ids, *params)
+            generation = self.cache.generation() if self.cache is not None else None
+            if misses:
+                if self.similarity_index is not None:
+                    users = batch_neighbors(self.similarity_index, misses, k, threshold_sim)
+                    records = self.graph.run(BATCH_INDEX_RECOMMENDATION_QUERY, users=users,
+                                             users_common=int(users_common), m=int(m)) if users else []
+                else:
+                    records = self.graph.run(BATCH_RECOMMENDATION_QUERY, user_ids=misses, k=int(k),
+                                             parking_common=int(parking_common), users_common=int(users_common),
+                                             threshold_sim=float(threshold_sim), m=int(m))
+                batch_collect(self.cache, generation, results, misses, records, *params)
+            return {user_id: results[user_id] for user_id in user_ids}
+
+        except Exception as e:
+            raise Exception(f"批量获取推荐停车场失败: {str(e)}")
+
+    @staticmethod
+    def _format_recommendations(result):
+        """
+        将推荐查询结果转换为字典列表
+        """
+        recommendations = []
+
+        # 将查询结果转换为字典列表
+        for record in result:
+            recommendations.append({
+                "id": record["id"],
+                "driving_distance": record["driving_distance"],
+                "walking_distance": record["walking_distance"],
+                "found_time": record["found_time"],
+                "parking_space_size": record["parking_space_size"],
+                "parking_difficulty": record["parking_difficulty"],
+                "near_elevator": record["near_elevator"],
+                "has_surveillance": record["has_surveillance"],
+                "fee": record["fee"],
+                "parking_type": record["parking_type"],
+                "longitude": record["longitude"],
+                "latitude": record["latitude"],
+                "grade": record["grade"],
+                "num": record["num"],
+            })
+
+        return recommendations
+
+
+class AsyncParkingGraphQuery:
+    """
+    AsyncParkingGraphQuery类是ParkingGraphQuery的异步版本，基于官方 neo4j AsyncDriver，
+    查询期间不会阻塞事件循环。多个实例可以共享同一个驱动（及其连接池）。
+    """
+
+    def __init__(self, driver, similarity_index=None, database=None, cache=None):
+        """
+        :param driver: neo4j.AsyncDriver对象，通常由 neo4j_pool.get_async_driver 获取
+        :param similarity_index: 离线构建的用户相似度索引（UserSimilarityIndex），为 None 时在查询中实时计算相似度
+        :param database: 数据库名称，为 None 时使用默认数据库
+        :param cache: 推荐结果与停车场节点的缓存（TTLLRUCache），为 None 时不使用缓存
+        """
+        self.driver = driver
+        self.similarity_index = similarity_index
+        self.cache = cache
+        self.database = database
+
+    async def warm_up(self):
+        """
+        预热本类使用的全部查询语句的执行计划
+        """
+        await async_warm_up(self.driver, RECOMMENDATION_QUERY_NAMES, database=self.database)
+
+    async def refresh_similarity_index(self):
+        """
+        如果离线任务更新了磁盘上的相似度索引文件，则在线程池中重新加载，不阻塞事件循环。
+        请求路径上不检查索引文件，由调用方（例如 app.py 的后台任务）定期调用本方法
+        :return: 是否重新加载
+        """
+        if self.similarity_index is None:
+            return False
+        reloaded = await asyncio.to_thread(self.similarity_index.refresh)
+        if reloaded and self.cache is not None:
+            self.cache.invalidate_tag(RECOMMENDATIONS_TAG)
+        return reloaded
+
+    async def _read(self, query, **params):
+        records, _, _ = await self.driver.execute_query(query, params, routing_=RoutingControl.READ,
+                                                        database_=self.database)
+        return records
+
+    async def query_park_node(self, park_id):
+        """
+        查询停车场节点
+        :param park_id: 停车场的ID
+        :return: 匹配的停车场节点，如果未找到则返回消息
+        """
+        try:
+            park_id = int(park_id)
+            generation = None
+            if self.cache is not None:
+                hit, find_node = self.cache.get(('park', park_id))
+                if hit:
+                    return find_node, None
+                generation = self.cache.generation()
+
+            records = await self._read(PARK_NODE_QUERY, park_id=park_id)
+            if records:
+                if self.cache is not None:
+                    self.cache.set(('park', park_id), records[0]["p"], generation=generation)
+                return records[0]["p"], None
+            else:
+                return None, f"未找到ID为 {park_id} 的停车场节点。"
+        except Exception as e:
+            raise Exception(f"查询停车场节点失败: {str(e)}")
+
+    async def query_park_nodes(self, park_ids):
+        """
+        批量查询停车场节点
+        :param park_ids: 停车场ID列表
+        :return: 字典，键为停车场ID，值为停车场属性字典
+        """
+        try:
+            park_ids = [int(park_id) for park_id in park_ids]
+            records = await self._read(PARK_NODES_QUERY, park_ids=park_ids)
+            return {record["id"]: dict(record["node"]) for record in records}
+        except Exception as e:
+            raise Exception(f"批量查询停车场节点失败: {str(e)}")
+
+    async def query_park_locations(self):
+        """
+        查询全部停车场的坐标
+        :return: (停车场ID数组, 经度数组, 纬度数组)
+        """
+        try:
+            return park_locations(await self._read(PARK_LOCATIONS_QUERY))
+        except Exception as e:
+            raise Exception(f"查询停车场坐标失败: {str(e)}")
+
+    async def query_park_attributes(self):
+        """
+        查询全部停车场用于偏好过滤的属性
+        :return: 停车场属性字典列表
+        """
+        try:
+            return [dict(record) for record in await self._read(PARK_ATTRIBUTES_QUERY)]
+        except Exception as e:
+            raise Exception(f"查询停车场属性失败: {str(e)}")
+
+    async def query_user_node(self, user_id):
+        """
+        查询用户节点
+        :param user_id: 用户的ID
+        :return: 匹配的用户节点，如果未找到则返回消息
+        """
+        try:
+            user_id = int(user_id)
+            generation = None
+            if self.cache is not None:
+                hit, find_node = self.cache.get(('user', user_id))
+                if hit:
+                    return find_node, None
+                generation = self.cache.generation()
+
+            records = await self._read(USER_NODE_QUERY, user_id=user_id)
+            if records:
+                if self.cache is not None:
+                    self.cache.set(('user', user_id), records[0]["u"], tags=(user_tag(user_id),),
+                                   generation=generation)
+                return records[0]["u"], None
+            else:
+                return None, f"未找到ID为 {user_id} 的用户节点。"
+        except Exception as e:
+            raise Exception(f"查询用户节点失败: {str(e)}")
+
+    async def query_user_nodes(self, user_ids):
+        """
+        批量查询用户节点
+        :param user_ids: 用户ID列表
+        :return: 字典，键为用户ID，值为用户属性字典；不存在的用户不出现在字典中
+        """
+        try:
+            nodes, misses, generation = cached_user_nodes(self.cache, user_ids)
+            if misses:
+                cache_user_nodes(self.cache, generation, nodes, await self._read(USER_NODES_QUERY, user_ids=misses))
+            return {user_id: dict(node) for user_id, node in nodes.items()}
+        except Exception as e:
+            raise Exception(f"批量查询用户节点失败: {str(e)}")
+
+    async def get_recommendations(self, user_id, k=10, parking_common=3, users_common=2, threshold_sim=0.9, m=5,
+                                  candidate_ids=None):
+        """
+        基于用户相似性获取停车场推荐列表，参数含义与 ParkingGraphQuery.get_recommendations 相同
+        """
+        try:
+            user_id = int(user_id)
+            cache_key = recommendations_cache_key(user_id, k, parking_common, users_common, threshold_sim, m)
+            use_cache = self.cache is not None and candidate_ids is None
+            if candidate_ids is not None:
+                candidate_ids = [int(park_id) for park_id in candidate_ids]
+            if use_cache:
+                hit, recommendations = self.cache.get(cache_key)
+                if hit:
+                    return recommendations
+                # 查询期间发生的失效会使本次结果不被写入缓存
+                generation = self.cache.generation()
+
+            records = []
+            if self.similarity_index is not None:
+                neighbors = self.similarity_index.neighbors(user_id, k=int(k), threshold_sim=float(threshold_sim))
+                if neighbors:
+                    records = await self._read(INDEX_RECOMMENDATION_QUERY, neighbors=neighbors,
+                                               users_common=int(users_common), m=int(m),
+                                               candidate_ids=candidate_ids)
+            elif candidate_ids is not None:
+                records = await self._read(NEARBY_RECOMMENDATION_QUERY, user_id=user_id, k=int(k),
+                                           parking_common=int(parking_common), users_common=int(users_common),
+                                           threshold_sim=float(threshold_sim), m=int(m),
+                                           candidate_ids=candidate_ids)
+            else:
+                records = await self._read(RECOMMENDATION_QUERY, user_id=user_id, k=int(k),
+                                           parking_common=int(parking_common), users_common=int(users_common),
+                                           threshold_sim=float(threshold_sim), m=int(m))
+            recommendations = ParkingGraphQuery._format_recommendations(records)
+
+            if use_cache:
+                self.cache.set(cache_key, recommendations, tags=recommendations_tags(user_id), generation=generation)
+            return recommendations
+
+        except Exception as e:
+            raise Exception(f"获取推荐停车场失败: {str(e)}")
+
+    async def get_recommendations_batch(self, user_ids, k=10, parking_common=3, users_common=2, threshold_sim=0.9,
+                                        m=5):
+        """
+        在一次查询中为多个用户获取停车场推荐列表，参数含义与 ParkingGraphQuery.get_recommendations_batch 相同
+        """
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+            params = (k, parking_common, users_common, threshold_sim, m)
+            results, misses = batch_cache_lookup(self.cache, user_ids, *params)
+            generation = self.cache.generation() if self.cache is not None else None
+            if misses:
+                records = []
+                if self.similarity_index is not None:
+                    users = batch_neighbors(self.similarity_index, misses, k, threshold_sim)
+                    if users:
+                        records = await self._read(BATCH_INDEX_RECOMMENDATION_QUERY, users=users,
+                                                   users_common=int(users_common), m=int(m))
+                else:
+                    records = await self._read(BATCH_RECOMMENDATION_QUERY, user_ids=misses, k=int(k),
+                                               parking_common=int(parking_common), users_common=int(users_common),
+                                               threshold_sim=float(threshold_sim), m=int(m))
+                batch_collect(self.cache, generation, results, misses, records, *params)
+            return {user_id: results[user_id] for user_id in user_ids}
+
+        except Exception as e:
+            raise Exception(f"批量获取推荐停车场失败: {str(e)}")
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+"""
+推荐结果与停车场节点的响应缓存：TTL 过期 + LRU 淘汰，并支持按标签（例如某个用户）精确失效。
+"""
+
+
+def user_tag(user_id):
+    """
+    用户相关缓存项的标签，偏好变化时按该标签失效
+    """
+    return 'user', int(user_id)
+
+
+# 全部推荐结果共有的标签。一条新评分不仅改变评分者自己的推荐，还会改变被评分停车场的得分，
+# 并可能改变其他用户的相似用户集合，因此评分写入时使全部推荐结果失效
+RECOMMENDATIONS_TAG = ('recommendations',)
+
+
+class TTLLRUCache:
+    """
+    TTLLRUCache类是一个带过期时间的LRU缓存。每个缓存项可以附带若干标签，
+    invalidate_tag 会删除带有该标签的全部缓存项。
+
+    为避免查询期间发生的失效被随后写入的旧结果覆盖，未命中时先用 generation 读取当前代数，
+    查询完成后把它传给 set；若期间任一标签被失效（或缓存被清空），set 不会写入该结果。
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        """
+        :param maxsize: 最多缓存的条目数，超出后淘汰最久未使用的条目
+        :param ttl: 缓存项的有效期（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data = OrderedDict()  # key -> (过期时间, 值, 标签)
+        self._tags = {}  # 标签 -> key 集合
+        self._lock = threading.Lock()
+
+        self._generation = 0  # 每次失效或清空加一
+        self._invalidated = {}  # 标签 -> 最近一次失效时的代数
+        self._cleared = 0  # 最近一次清空时的代数
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_writes = 0
+
+    def _remove(self, key):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        """
+        读取缓存
+        :param key: 缓存键
+        :return: (是否命中, 缓存的值)
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def generation(self):
+        """
+        返回当前代数，在缓存未命中、开始查询之前读取
+        """
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, tags=(), generation=None):
+        """
+        写入缓存
+        :param key: 缓存键
+        :param value: 缓存的值
+        :param tags: 该缓存项的标签
+        :param generation: 开始计算该值之前由 generation() 读取的代数，为 None 时不检查
+        :return: 是否写入
+        """
+        tags = tuple(tags)
+        with self._lock:
+            if generation is not None and (self._cleared > generation or
+                                           any(self._invalidated.get(tag, 0) > generation for tag in tags)):
+                # 计算期间相关标签已被失效，该值可能已经过时
+                self.stale_writes += 1
+                return False
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate_tag(self, tag):
+        """
+        删除带有指定标签的全部缓存项
+        :param tag: 标签
+        :return: 删除的条目数
+        """
+        with self._lock:
+            self._generation += 1
+            self._invalidated[tag] = self._generation
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._generation += 1
+            self._cleared = self._generation
+
+    def stats(self):
+        """
+        返回缓存的统计信息，用于评估缓存大小是否合适
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'stale_writes': self.stale_writes,
+            }
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+
+"""
+停车场坐标的内存空间索引：把经纬度投影到平面（米）后按固定大小的网格分桶，
+按半径查询时只检查覆盖查询圆的网格，工作量与附近的停车场数量成正比，而不是全城的停车场数量。
+"""
+
+EARTH_RADIUS = 6371000.0  # 地球半径（米）
+
+
+def parse_location(location):
+    """
+    解析 "经度,纬度" 格式的位置字符串（与高德地图 API 返回的 location 字段格式一致）
+    :param location: 位置字符串
+    :return: (经度, 纬度)
+    """
+    try:
+        longitude, latitude = (float(value) for value in location.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError(f"无法解析位置: {location}，应为 '经度,纬度' 格式。")
+    return longitude, latitude
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    计算两点（或一点与一组点）之间的球面距离（米）
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+class GridSpatialIndex:
+    """
+    GridSpatialIndex类是停车场坐标的网格索引。网格数据保存为按网格编号排序的扁平数组，
+    rebuild 会整体替换这些数组，因此可以在查询的同时从数据库重新加载。
+    """
+
+    def __init__(self, cell_size=500.0):
+        """
+        :param cell_size: 网格边长（米），取值接近常用查询半径时效率最好
+        """
+        self.cell_size = cell_size
+        self._lock = threading.Lock()
+        self.rebuild([], [], [])
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def rebuild(self, ids, longitudes, latitudes):
+        """
+        根据全部停车场坐标重建索引
+        :param ids: 停车场ID数组
+        :param longitudes: 经度数组
+        :param latitudes: 纬度数组
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+
+        # 以所有停车场的平均纬度做等距圆柱投影，城市范围内误差可以忽略
+        lat0 = float(latitudes.mean()) if latitudes.size else 0.
+        meters_per_degree = np.radians(1.) * EARTH_RADIUS
+        kx = meters_per_degree * np.cos(np.radians(lat0))
+        ky = meters_per_degree
+
+        cx = np.floor(longitudes * kx / self.cell_size).astype(np.int64)
+        cy = np.floor(latitudes * ky / self.cell_size).astype(np.int64)
+        order = np.lexsort((cy, cx))
+        cx, cy = cx[order], cy[order]
+
+        # 每个非空网格在排序后数组中的起止位置
+        cell_keys = np.stack([cx, cy], axis=1)
+        unique_cells, starts = np.unique(cell_keys, axis=0, return_index=True) if len(ids) else \
+            (np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.int64))
+        ends = np.append(starts[1:], len(ids))
+        cells = {(int(x), int(y)): (int(s), int(e)) for (x, y), s, e in zip(unique_cells, starts, ends)}
+
+        state = (ids[order], longitudes[order], latitudes[order], cells, kx, ky)
+        with self._lock:
+            self._state = state
+
+    def query_radius(self, longitude, latitude, radius):
+        """
+        查询距离给定位置不超过 radius 米的停车场
+        :param longitude: 经度
+        :param latitude: 纬度
+        :param radius: 半径（米）
+        :return: (停车场ID数组, 距离数组)，按距离升序排列
+        """
+        ids, longitudes, latitudes, cells, kx, ky = self._state
+
+        # 投影只在平均纬度处精确，稍微放大搜索范围以覆盖整个查询圆
+        reach = radius * 1.05 + 1.
+        x0 = int(np.floor((longitude * kx - reach) / self.cell_size))
+        x1 = int(np.floor((longitude * kx + reach) / self.cell_size))
+        y0 = int(np.floor((latitude * ky - reach) / self.cell_size))
+        y1 = int(np.floor((latitude * ky + reach) / self.cell_size))
+
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+            # 查询范围覆盖的网格比非空网格还多时，直接遍历非空网格
+            spans = [span for (x, y), span in cells.items() if x0 <= x <= x1 and y0 <= y <= y1]
+        else:
+            spans = [cells[(x, y)] for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if (x, y) in cells]
+        if not spans:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        candidates = np.concatenate([np.arange(start, end) for start, end in spans])
+        distances = haversine(longitude, latitude, longitudes[candidates], latitudes[candidates])
+        keep = distances <= radius
+        candidates, distances = candidates[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return ids[candidates[order]], distances[order]
@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+
+"""
+停车场属性的列式快照：把费用、类型、停车难度、距离等属性保存为 numpy 数组，
+在排序阶段用一次向量化计算对候选停车场同时应用用户的硬性约束（费用、距离上限）和软性偏好（类型、难度）。
+"""
+
+# 停车难度的等级，与前端偏好设置中的选项一致
+DIFFICULTY_LEVELS = {'容易': 0, '中等': 1, '困难': 2}
+
+
+def _float_column(records, key):
+    return np.array([np.nan if record.get(key) is None else float(record[key]) for record in records],
+                    dtype=np.float64)
+
+
+class ParkingSpotSnapshot:
+    """
+    ParkingSpotSnapshot类保存全部停车场属性的列式快照，并根据用户偏好对候选停车场过滤和重排序。
+    rebuild 会整体替换快照，因此可以在处理请求的同时从数据库重新加载。
+    """
+
+    def __init__(self, type_weight=0.3, difficulty_weight=0.2):
+        """
+        :param type_weight: 停车场类型符合偏好时的加分
+        :param difficulty_weight: 停车难度与偏好一致时的加分，相差一个等级时减半，相差两个等级时为0
+        """
+        self.type_weight = type_weight
+        self.difficulty_weight = difficulty_weight
+        self._lock = threading.Lock()
+        self.rebuild([])
+
+    def __len__(self):
+        return len(self._state['ids'])
+
+    def rebuild(self, records):
+        """
+        根据全部停车场属性重建快照
+        :param records: 停车场属性字典列表，包含 id, fee, parking_type, parking_difficulty,
+                        walking_distance, driving_distance
+        """
+        records = list(records)
+        ids = np.array([int(record['id']) for record in records], dtype=np.int64)
+
+        types = [record.get('parking_type') or '' for record in records]
+        type_names, type_codes = np.unique(np.array(types, dtype=object), return_inverse=True) if records else \
+            (np.empty(0, dtype=object), np.empty(0, dtype=np.int64))
+        difficulty = np.array([DIFFICULTY_LEVELS.get(record.get('parking_difficulty'), -1) for record in records],
+                              dtype=np.int64)
+
+        # 每一列末尾追加一个属性未知的哨兵行，快照中不存在的停车场（行号 -1）自然落在这一行上
+        state = {
+            'ids': ids,
+            'fee': np.append(_float_column(records, 'fee'), np.nan),
+            'walking_distance': np.append(_float_column(records, 'walking_distance'), np.nan),
+            'driving_distance': np.append(_float_column(records, 'driving_distance'), np.nan),
+            'type': np.append(type_codes.astype(np.int64), -1),
+            'difficulty': np.append(difficulty, -1),
+            'type_vocabulary': {name: code for code, name in enumerate(type_names.tolist())},
+        }
+        # ID -> 行号的查找表：按ID排序后二分查找，内存只与停车场数量有关，而与ID的取值范围无关
+        state['rows'] = np.argsort(ids, kind='stable')
+        state['sorted_ids'] = ids[state['rows']]
+        with self._lock:
+            self._state = state
+
+    def rerank(self, ids, scores, preferences, m=None):
+        """
+        对候选停车场应用用户的硬性约束和软性偏好
+        :param ids: 候选停车场ID数组
+        :param scores: 排序阶段（Cypher 评分或嵌入得分）给出的得分，越大越好
+        :param preferences: 用户偏好字典（User 节点属性），字段与 UserPreferences 相同，缺失或为 None 的字段不生效
+        :param m: 返回的数量，为 None 时返回全部满足约束的候选
+        :return: (候选在 ids 中的下标数组, 重排序后的得分数组)，按得分降序排列
+        """
+        state = self._state
+        ids = np.asarray(ids, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        if len(state['sorted_ids']):
+            positions = np.minimum(np.searchsorted(state['sorted_ids'], ids), len(state['sorted_ids']) - 1)
+            found = state['sorted_ids'][positions] == ids
+            rows[found] = state['rows'][positions[found]]
+
+        # 硬性约束：属性未知（NaN）的停车场不会被约束排除
+        keep = np.isfinite(scores)
+        for column, key in (('fee', 'max_parking_fee'), ('walking_distance', 'max_walking_distance'),
+                            ('driving_distance', 'max_driving_distance')):
+            limit = preferences.get(key)
+            if limit is not None:
+                keep &= ~(state[column][rows] > float(limit))
+
+        positions = np.flatnonzero(keep)
+        rows, scores = rows[positions], scores[positions]
+        if len(positions) == 0:
+            return positions, scores
+
+        # 把排序阶段的得分归一化到 [0, 1]，使其与偏好加分可比
+        low, high = scores.min(), scores.max()
+        final = (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+        preferred_types = [state['type_vocabulary'][name] for name in preferences.get('preferred_parking_types') or []
+                           if name in state['type_vocabulary']]
+        if preferred_types:
+            final += self.type_weight * np.isin(state['type'][rows], preferred_types)
+
+        preferred_difficulty = DIFFICULTY_LEVELS.get(preferences.get('preferred_parking_difficulty'), -1)
+        if preferred_difficulty >= 0:
+            difficulty = state['difficulty'][rows]
+            closeness = 1. - np.abs(difficulty - preferred_difficulty) / 2.
+            final += self.difficulty_weight * np.where(difficulty >= 0, closeness, 0.)
+
+        order = np.argsort(-final, kind='stable')
+        if m is not None:
+            order = order[:max(int(m), 0)]
+        return positions[order], final[order]
@@ -0,0 +1,251 @@
+import os
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+"""
+离线用户相似度索引：根据 RATED 关系预先计算每个用户的 top-k 相似用户，
+以 CSR 稀疏矩阵（用户 × 用户）形式保存在磁盘上，推荐时只需查表。
+"""
+
+INDEX_VERSION = 1
+
+
+class UserSimilarityIndex:
+    """
+    UserSimilarityIndex类负责构建、增量更新、保存和加载用户相似度索引。
+
+    相似度与原 Cypher 查询保持一致：只在两名用户共同打分的停车场上计算余弦相似度，
+    并要求共同打分数不少于 parking_common、相似度大于 threshold_sim。
+    """
+
+    def __init__(self, top_k=10, parking_common=3, threshold_sim=0.9, block_size=2048):
+        """
+        :param top_k: 每个用户保存的最相似用户数量
+        :param parking_common: 至少共同打分的停车场数目
+        :param threshold_sim: 用户相似度的最小阈值
+        :param block_size: 计算相似度时每批处理的用户数量，用于控制内存峰值
+        """
+        self.top_k = top_k
+        self.parking_common = parking_common
+        self.threshold_sim = threshold_sim
+        self.block_size = block_size
+
+        self.ratings = sp.csr_matrix((0, 0), dtype=np.float32)  # 用户 × 停车场 评分矩阵
+        self.similarity = sp.csr_matrix((0, 0), dtype=np.float32)  # 用户 × 用户 top-k 相似度矩阵
+
+        self.path = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ratings_to_csr(user_ids, spot_ids, grades, shape):
+        """
+        将评分三元组转换为CSR矩阵，同一(用户, 停车场)重复出现时保留最后一条
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        spot_ids = np.asarray(spot_ids, dtype=np.int64)
+        grades = np.asarray(grades, dtype=np.float32)
+        if grades.size and grades.min() <= 0:
+            raise ValueError("评分必须为正数。")
+
+        # 去重：保留每个(用户, 停车场)最后出现的评分
+        keys = user_ids * shape[1] + spot_ids
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last
+        return sp.csr_matrix((grades[last], (user_ids[last], spot_ids[last])), shape=shape, dtype=np.float32)
+
+    def _compute_rows(self, rows):
+        """
+        计算指定用户的 top-k 相似用户
+        :param rows: 用户ID数组
+        :return: 形状为 (len(rows), n_users) 的CSR相似度矩阵
+        """
+        R = self.ratings
+        B = R.copy()
+        B.data[:] = 1.
+        R2 = R.multiply(R).tocsr()
+
+        sub_r, sub_b, sub_r2 = R[rows], B[rows], R2[rows]
+
+        # 只在共同打分的停车场上累加，因此四个矩阵的稀疏结构相同
+        dot = (sub_r @ R.T).tocsr()
+        common = (sub_b @ B.T).tocsr()
+        sq1 = (sub_r2 @ B.T).tocsr()
+        sq2 = (sub_b @ R2.T).tocsr()
+        for mat in (dot, common, sq1, sq2):
+            mat.sort_indices()
+
+        row_idx = np.repeat(np.arange(len(rows)), np.diff(common.indptr))
+        col_idx = common.indices
+        sim = dot.data / (np.sqrt(sq1.data) * np.sqrt(sq2.data))
+
+        keep = (common.data >= self.parking_common) & (sim > self.threshold_sim) & (col_idx != rows[row_idx])
+        row_idx, col_idx, sim = row_idx[keep], col_idx[keep], sim[keep]
+
+        # 每行按相似度降序排列，只保留前 top_k 个
+        order = np.lexsort((-sim, row_idx))
+        row_idx, col_idx, sim = row_idx[order], col_idx[order], sim[order]
+        row_start = np.searchsorted(row_idx, np.arange(len(rows)))
+        rank = np.arange(len(row_idx)) - row_start[row_idx]
+        keep = rank < self.top_k
+
+        return sp.csr_matrix((sim[keep].astype(np.float32), (row_idx[keep], col_idx[keep])),
+                             shape=(len(rows), R.shape[0]), dtype=np.float32)
+
+    def _compute_all(self):
+        n_users = self.ratings.shape[0]
+        blocks = []
+        for start in range(0, n_users, self.block_size):
+            rows = np.arange(start, min(start + self.block_size, n_users))
+            blocks.append(self._compute_rows(rows))
+        if not blocks:
+            return sp.csr_matrix((n_users, n_users), dtype=np.float32)
+        return sp.vstack(blocks, format='csr')
+
+    def build(self, user_ids, spot_ids, grades):
+        """
+        根据全部评分数据构建索引
+        :param user_ids: 用户ID数组
+        :param spot_ids: 停车场ID数组
+        :param grades: 评分数组
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        spot_ids = np.asarray(spot_ids, dtype=np.int64)
+        shape = (int(user_ids.max()) + 1 if user_ids.size else 0,
+                 int(spot_ids.max()) + 1 if spot_ids.size else 0)
+
+        ratings = self._ratings_to_csr(user_ids, spot_ids, grades, shape)
+        with self._lock:
+            self.ratings = ratings
+            self.similarity = self._compute_all()
+
+    def update(self, user_ids, spot_ids, grades):
+        """
+        增量更新索引：写入新的评分，只重新计算受影响用户（评分用户及其共同打分用户）的相似度行
+        :param user_ids: 新评分的用户ID数组
+        :param spot_ids: 新评分的停车场ID数组
+        :param grades: 新评分数组
+        :return: 被重新计算的用户ID数组
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        spot_ids = np.asarray(spot_ids, dtype=np.int64)
+        if user_ids.size == 0:
+            return np.empty(0, dtype=np.int64)
+
+        with self._lock:
+            n_users = max(self.ratings.shape[0], int(user_ids.max()) + 1)
+            n_spots = max(self.ratings.shape[1], int(spot_ids.max()) + 1)
+            ratings = self.ratings.copy()
+            ratings.resize((n_users, n_spots))
+            similarity = self.similarity.copy()
+            similarity.resize((n_users, n_users))
+
+            # 覆盖已有评分：先清除旧值，再加上新值
+            new = self._ratings_to_csr(user_ids, spot_ids, grades, (n_users, n_spots))
+            pattern = new.copy()
+            pattern.data[:] = 1.
+            ratings = (ratings - ratings.multiply(pattern) + new).tocsr()
+            ratings.eliminate_zeros()
+            self.ratings = ratings
+
+            # 受影响的用户：新评分用户本身，以及所有与其有共同打分停车场的用户
+            raters = ratings[:, np.unique(spot_ids)].tocsc()
+            affected = np.union1d(np.unique(user_ids), np.unique(raters.indices))
+
+            new_rows = self._compute_rows(affected)
+            mask = np.ones(n_users, dtype=np.float32)
+            mask[affected] = 0.
+            scatter = sp.csr_matrix((np.ones(len(affected), dtype=np.float32), (affected, np.arange(len(affected)))),
+                                    shape=(n_users, len(affected)))
+            self.similarity = (sp.diags(mask) @ similarity + scatter @ new_rows).tocsr()
+            return affected
+
+    def neighbors(self, user_id, k=None, threshold_sim=None):
+        """
+        查询用户的相似用户
+        :param user_id: 用户ID
+        :param k: 返回的相似用户数量，默认为 top_k
+        :param threshold_sim: 额外的相似度阈值，只返回相似度大于该值的用户
+        :return: [{'id': 相似用户ID, 'sim': 相似度}, ...]，按相似度降序排列
+        """
+        similarity = self.similarity
+        user_id = int(user_id)
+        if user_id < 0 or user_id >= similarity.shape[0]:
+            return []
+
+        start, end = similarity.indptr[user_id], similarity.indptr[user_id + 1]
+        ids = similarity.indices[start:end]
+        sims = similarity.data[start:end]
+        if threshold_sim is not None:
+            keep = sims > threshold_sim
+            ids, sims = ids[keep], sims[keep]
+
+        order = np.argsort(-sims, kind='stable')[:k if k is not None else self.top_k]
+        return [{'id': int(ids[i]), 'sim': float(sims[i])} for i in order]
+
+    def save(self, path):
+        """
+        将索引保存为 .npz 文件
+        :param path: 文件路径
+        """
+        with self._lock:
+            tmp_path = path + '.tmp.npz'
+            np.savez(tmp_path,
+                     version=INDEX_VERSION,
+                     params=np.array([self.top_k, self.parking_common, self.threshold_sim], dtype=np.float64),
+                     ratings_shape=np.array(self.ratings.shape),
+                     ratings_data=self.ratings.data,
+                     ratings_indices=self.ratings.indices,
+                     ratings_indptr=self.ratings.indptr,
+                     sim_shape=np.array(self.similarity.shape),
+                     sim_data=self.similarity.data,
+                     sim_indices=self.similarity.indices,
+                     sim_indptr=self.similarity.indptr)
+            # 原子替换，避免在线服务读取到写了一半的文件
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        从 .npz 文件加载索引
+        :param path: 文件路径
+        :return: UserSimilarityIndex对象
+        """
+        index = cls()
+        index._load(path)
+        return index
+
+    def _load(self, path):
+        with np.load(path) as f:
+            if int(f['version']) != INDEX_VERSION:
+                raise ValueError(f"相似度索引版本不匹配: {int(f['version'])} != {INDEX_VERSION}")
+            top_k, parking_common, threshold_sim = f['params']
+            ratings = sp.csr_matrix((f['ratings_data'], f['ratings_indices'], f['ratings_indptr']),
+                                    shape=tuple(f['ratings_shape']))
+            similarity = sp.csr_matrix((f['sim_data'], f['sim_indices'], f['sim_indptr']),
+                                       shape=tuple(f['sim_shape']))
+
+        with self._lock:
+            self.top_k, self.parking_common, self.threshold_sim = int(top_k), int(parking_common), float(threshold_sim)
+            self.ratings = ratings
+            self.similarity = similarity
+            self.path = path
+            self._mtime = os.path.getmtime(path)
+
+    def refresh(self):
+        """
+        如果磁盘上的索引文件已被离线任务更新，则重新加载
+        :return: 是否重新加载
+        """
+        if self.path is None:
+            return False
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._load(self.path)
+        return True
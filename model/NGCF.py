@@ -1,5 +1,6 @@
 
 
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -22,6 +23,9 @@ class NGCF(nn.Module):
         self.layers = eval(args.layer_size)
         self.decay = eval(args.regs)[0]
 
+        # fast mode: dense matmuls of the propagation and the BPR scores run in bfloat16.
+        self.bf16 = getattr(args, 'amp', 'none') == 'bf16'
+
         """
         *********************************************************
         Init the weight of user-item.
@@ -34,6 +38,9 @@ class NGCF(nn.Module):
         """
         self.sparse_norm_adj = self._convert_sp_mat_to_sp_tensor(self.norm_adj).to(self.device)
 
+        # (weights version, u_g_embeddings, i_g_embeddings) of the last inference-mode propagation.
+        self._inference_cache = None
+
     def init_weight(self):
         # xavier init
         initializer = nn.init.xavier_uniform_
@@ -59,27 +66,32 @@ class NGCF(nn.Module):
         return embedding_dict, weight_dict
 
     def _convert_sp_mat_to_sp_tensor(self, X):
-        coo = X.tocoo()
-        i = torch.LongTensor([coo.row, coo.col])
-        v = torch.from_numpy(coo.data).float()
-        return torch.sparse.FloatTensor(i, v, coo.shape)
+        # CSR layout: the sparse-dense matmul is parallelized over rows on CPU and runs on cuSPARSE on GPU.
+        csr = X.tocsr()
+        csr.sort_indices()
+        return torch.sparse_csr_tensor(torch.from_numpy(csr.indptr.astype(np.int64)),
+                                       torch.from_numpy(csr.indices.astype(np.int64)),
+                                       torch.from_numpy(csr.data.astype(np.float32)),
+                                       csr.shape, check_invariants=False)
 
     def sparse_dropout(self, x, rate, noise_shape):
         random_tensor = 1 - rate
-        random_tensor += torch.rand(noise_shape).to(x.device)
-        dropout_mask = torch.floor(random_tensor).type(torch.bool)
-        i = x._indices()
-        v = x._values()
+        random_tensor += torch.rand(noise_shape, device=x.device)
+        dropout_mask = torch.floor(random_tensor)
 
-        i = i[:, dropout_mask]
-        v = v[dropout_mask]
+        # dropped edges get a zero weight instead of being removed, so the CSR index arrays are shared with x.
+        v = x.values() * dropout_mask * (1. / (1 - rate))
+        return torch.sparse_csr_tensor(x.crow_indices(), x.col_indices(), v, x.shape, check_invariants=False)
 
-        out = torch.sparse.FloatTensor(i, v, x.shape).to(x.device)
-        return out * (1. / (1 - rate))
+    def _dot(self, a, b):
+        # row-wise dot product, computed in bfloat16 in fast mode and returned in float32.
+        if self.bf16:
+            return torch.sum(torch.mul(a.bfloat16(), b.bfloat16()), axis=1).float()
+        return torch.sum(torch.mul(a, b), axis=1)
 
     def create_bpr_loss(self, users, pos_items, neg_items):
-        pos_scores = torch.sum(torch.mul(users, pos_items), axis=1)
-        neg_scores = torch.sum(torch.mul(users, neg_items), axis=1)
+        pos_scores = self._dot(users, pos_items)
+        neg_scores = self._dot(users, neg_items)
 
         maxi = nn.LogSigmoid()(pos_scores - neg_scores)
 
@@ -96,8 +108,11 @@ class NGCF(nn.Module):
     def rating(self, u_g_embeddings, pos_i_g_embeddings):
         return torch.matmul(u_g_embeddings, pos_i_g_embeddings.t())
 
-    def forward(self, users, pos_items, neg_items, drop_flag=True):
-
+    def propagate(self, drop_flag=True):
+        """
+        Run the L-layer propagation over the whole graph.
+        :return: final embeddings of all users and all items
+        """
         A_hat = self.sparse_dropout(self.sparse_norm_adj,
                                     self.node_dropout,
                                     self.sparse_norm_adj._nnz()) if drop_flag else self.sparse_norm_adj
@@ -110,22 +125,28 @@ class NGCF(nn.Module):
         for k in range(len(self.layers)):
             side_embeddings = torch.sparse.mm(A_hat, ego_embeddings)
 
-            # transformed sum messages of neighbors.
-            sum_embeddings = torch.matmul(side_embeddings, self.weight_dict['W_gc_%d' % k]) \
-                                             + self.weight_dict['b_gc_%d' % k]
+            # the sparse propagation stays in float32, only the dense transforms are autocast;
+            # adding the float32 biases brings the results back to float32.
+            with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=self.bf16):
+                # transformed sum messages of neighbors.
+                sum_embeddings = torch.matmul(side_embeddings, self.weight_dict['W_gc_%d' % k]) \
+                                                 + self.weight_dict['b_gc_%d' % k]
 
-            # bi messages of neighbors.
-            # element-wise product
-            bi_embeddings = torch.mul(ego_embeddings, side_embeddings)
-            # transformed bi messages of neighbors.
-            bi_embeddings = torch.matmul(bi_embeddings, self.weight_dict['W_bi_%d' % k]) \
-                                            + self.weight_dict['b_bi_%d' % k]
+                # bi messages of neighbors.
+                # element-wise product
+                bi_embeddings = torch.mul(ego_embeddings, side_embeddings)
+                # transformed bi messages of neighbors.
+                bi_embeddings = torch.matmul(bi_embeddings, self.weight_dict['W_bi_%d' % k]) \
+                                                + self.weight_dict['b_bi_%d' % k]
 
             # non-linear activation.
             ego_embeddings = nn.LeakyReLU(negative_slope=0.2)(sum_embeddings + bi_embeddings)
 
             # message dropout.
-            ego_embeddings = nn.Dropout(self.mess_dropout[k])(ego_embeddings)
+            # unlike the original implementation (a fresh nn.Dropout, active even at test time), it is only
+            # applied in training mode: test() switches to eval mode, so evaluation and the inference cache
+            # see deterministic embeddings. Training is unaffected.
+            ego_embeddings = F.dropout(ego_embeddings, p=self.mess_dropout[k], training=self.training)
 
             # normalize the distribution of embeddings.
             norm_embeddings = F.normalize(ego_embeddings, p=2, dim=1)
@@ -135,6 +156,29 @@ class NGCF(nn.Module):
         all_embeddings = torch.cat(all_embeddings, 1)
         u_g_embeddings = all_embeddings[:self.n_user, :]
         i_g_embeddings = all_embeddings[self.n_user:, :]
+        return u_g_embeddings, i_g_embeddings
+
+    def _weights_version(self):
+        # changes whenever a parameter is updated in place (optimizer step, load_state_dict) or moved.
+        return tuple((id(p), p._version, p.data_ptr()) for p in self.parameters())
+
+    def inference_embeddings(self):
+        """
+        Final user/item embeddings without dropout, propagated once and reused until the weights change.
+        """
+        version = self._weights_version()
+        if self._inference_cache is None or self._inference_cache[0] != version:
+            self._inference_cache = None
+            with torch.no_grad():
+                self._inference_cache = (version,) + self.propagate(drop_flag=False)
+        return self._inference_cache[1:]
+
+    def forward(self, users, pos_items, neg_items, drop_flag=True):
+        if not self.training and not drop_flag:
+            # inference mode: every lookup is served from the cached propagation.
+            u_g_embeddings, i_g_embeddings = self.inference_embeddings()
+        else:
+            u_g_embeddings, i_g_embeddings = self.propagate(drop_flag)
 
         """
         *********************************************************
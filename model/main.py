@@ -3,10 +3,15 @@
 import torch
 import torch.optim as optim
 import numpy as np
+import scipy.sparse as sp
 from NGCF import NGCF
 from utility.helper import *
 from utility.batch_test import *
+from utility.prefetch import PrefetchSampler
+from utility.benchmark import compare_modes, thread_scaling
 
+import sys
+import json
 import warnings
 warnings.filterwarnings('ignore')
 from time import time
@@ -14,17 +19,50 @@ from time import time
 
 if __name__ == '__main__':
 
-    args.device = torch.device('cuda:0')
+    if args.gpu_id >= 0 and torch.cuda.is_available():
+        args.device = torch.device('cuda:%d' % args.gpu_id)
+    else:
+        args.device = torch.device('cpu')
+        # set before any parallel work, the inter-op pool cannot be resized once it has started.
+        if args.num_interop_threads > 0:
+            torch.set_num_interop_threads(args.num_interop_threads)
+        if args.num_threads > 0:
+            torch.set_num_threads(args.num_threads)
+        print('train on cpu with %d threads' % torch.get_num_threads())
 
     plain_adj, norm_adj, mean_adj = data_generator.get_adj_mat()
+    if args.adj_type == 'plain':
+        adj = plain_adj
+    elif args.adj_type == 'norm':
+        adj = norm_adj
+    elif args.adj_type == 'gcmc':
+        adj = mean_adj
+    else:
+        adj = mean_adj + sp.eye(mean_adj.shape[0])
 
     args.node_dropout = eval(args.node_dropout)
     args.mess_dropout = eval(args.mess_dropout)
 
-    model = NGCF(data_generator.n_users,
-                 data_generator.n_items,
-                 norm_adj,
-                 args).to(args.device)
+    def build_model(model_args):
+        model = NGCF(data_generator.n_users,
+                     data_generator.n_items,
+                     adj,
+                     model_args).to(model_args.device)
+        if model_args.compile:
+            # compiles the forward in place, parameter names in the state_dict stay unchanged.
+            model.compile()
+        return model
+
+    if args.benchmark_threads > 0:
+        thread_scaling(build_model, data_generator, args, args.benchmark_threads)
+        sys.exit(0)
+
+    if args.benchmark:
+        compare_modes(build_model, lambda m: test(m, list(data_generator.test_set.keys()), drop_flag=False),
+                      data_generator, args, Ks)
+        sys.exit(0)
+
+    model = build_model(args)
 
     t0 = time()
     """
@@ -34,6 +72,19 @@ if __name__ == '__main__':
     cur_best_pre_0, stopping_step = 0, 0
     optimizer = optim.Adam(model.parameters(), lr=args.lr)
 
+    # sample the next batches on background threads while the model trains on the current one.
+    sampler = None
+    if args.prefetch > 0:
+        sampler = PrefetchSampler(data_generator, args.device, n_workers=args.prefetch,
+                                  queue_size=args.prefetch_queue, seed=args.seed)
+
+    # metrics per sparsity group, aggregated from the per-user results of the regular evaluation.
+    if args.report == 1:
+        split_uids, split_state = data_generator.get_sparsity_split()
+        report_path = '%sreport/%s/ngcf.json' % (args.proj_path, args.dataset)
+        ensureDir(report_path)
+        report_loger = []
+
     loss_loger, pre_loger, rec_loger, ndcg_loger, hit_loger = [], [], [], [], []
     for epoch in range(args.epoch):
         t1 = time()
@@ -41,7 +92,7 @@ if __name__ == '__main__':
         n_batch = data_generator.n_train // args.batch_size + 1
 
         for idx in range(n_batch):
-            users, pos_items, neg_items = data_generator.sample()
+            users, pos_items, neg_items = next(sampler) if sampler is not None else data_generator.sample()
             u_g_embeddings, pos_i_g_embeddings, neg_i_g_embeddings = model(users,
                                                                            pos_items,
                                                                            neg_items,
@@ -67,10 +118,24 @@ if __name__ == '__main__':
 
         t2 = time()
         users_to_test = list(data_generator.test_set.keys())
-        ret = test(model, users_to_test, drop_flag=False)
+        ret = test(model, users_to_test, drop_flag=False, per_user=args.report == 1)
 
         t3 = time()
 
+        if args.report == 1:
+            groups = sparsity_report(ret, users_to_test, split_uids, split_state)
+            report_loger.append({'epoch': epoch, 'train_time': t2 - t1, 'test_time': t3 - t2,
+                                 'loss': float(loss), 'Ks': Ks,
+                                 'all': {key: np.asarray(ret[key]).tolist()
+                                         for key in ['precision', 'recall', 'ndcg', 'hit_ratio', 'auc']},
+                                 'groups': groups})
+            with open(report_path, 'w') as f:
+                json.dump(report_loger, f, indent=2)
+            if args.verbose > 0:
+                for group in groups:
+                    print('%s: recall=[%.5f, %.5f], ndcg=[%.5f, %.5f]' % (
+                        group['state'], group['recall'][0], group['recall'][-1], group['ndcg'][0], group['ndcg'][-1]))
+
         loss_loger.append(loss)
         rec_loger.append(ret['recall'])
         pre_loger.append(ret['precision'])
@@ -99,6 +164,9 @@ if __name__ == '__main__':
             torch.save(model.state_dict(), args.weights_path + str(epoch) + '.pkl')
             print('save the weights in path: ', args.weights_path + str(epoch) + '.pkl')
 
+    if sampler is not None:
+        sampler.close()
+
     recs = np.array(rec_loger)
     pres = np.array(pre_loger)
     ndcgs = np.array(ndcg_loger)
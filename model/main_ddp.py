@@ -0,0 +1,168 @@
+'''
+Data-parallel NGCF training on CPU with torch.distributed (gloo backend).
+
+Every rank samples its own shard of each global batch (batch_size // world_size triples from a per-rank
+random stream), DistributedDataParallel all-reduces the gradients of embedding_dict and weight_dict, and
+rank 0 alone evaluates, checkpoints and decides on early stopping.
+
+Run locally with several processes on one machine:
+    python main_ddp.py --dataset gowalla --world_size 4
+or with torchrun (one process per rank, RANK / WORLD_SIZE / MASTER_ADDR / MASTER_PORT from the environment):
+    torchrun --nproc_per_node 4 main_ddp.py --dataset gowalla
+'''
+import os
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.optim as optim
+import numpy as np
+import scipy.sparse as sp
+from torch.nn.parallel import DistributedDataParallel as DDP
+from NGCF import NGCF
+from utility.helper import *
+from utility.batch_test import *
+from utility.prefetch import PrefetchSampler
+
+import warnings
+warnings.filterwarnings('ignore')
+from time import time
+
+
+def run(rank, world_size):
+    os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+    os.environ.setdefault('MASTER_PORT', '29500')
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+
+    # split the cores of the host between the ranks unless the thread count is given.
+    torch.set_num_threads(args.num_threads if args.num_threads > 0 else max(1, os.cpu_count() // world_size))
+    args.device = torch.device('cpu')
+
+    # rank 0 alone builds and saves the adjacency matrices when they are missing, the other ranks
+    # wait for it and load the saved files instead of writing the same files concurrently.
+    if rank == 0:
+        plain_adj, norm_adj, mean_adj = data_generator.get_adj_mat()
+    dist.barrier()
+    if rank != 0:
+        plain_adj, norm_adj, mean_adj = data_generator.get_adj_mat()
+    if args.adj_type == 'plain':
+        adj = plain_adj
+    elif args.adj_type == 'norm':
+        adj = norm_adj
+    elif args.adj_type == 'gcmc':
+        adj = mean_adj
+    else:
+        adj = mean_adj + sp.eye(mean_adj.shape[0])
+
+    args.node_dropout = eval(args.node_dropout)
+    args.mess_dropout = eval(args.mess_dropout)
+
+    if args.seed is not None:
+        torch.manual_seed(args.seed)
+    model = NGCF(data_generator.n_users,
+                 data_generator.n_items,
+                 adj,
+                 args)
+    # DDP broadcasts the parameters of rank 0, every rank starts from the same weights.
+    ddp_model = DDP(model)
+
+    # every rank draws its shard of the global batch from its own random stream.
+    data_generator.batch_size = max(1, args.batch_size // world_size)
+    rank_seed = None if args.seed is None else [args.seed, rank]
+    data_generator.rng = np.random.default_rng(rank_seed)
+
+    t0 = time()
+    """
+    *********************************************************
+    Train.
+    """
+    cur_best_pre_0, stopping_step = 0, 0
+    optimizer = optim.Adam(ddp_model.parameters(), lr=args.lr)
+
+    sampler = None
+    if args.prefetch > 0:
+        sampler = PrefetchSampler(data_generator, args.device, n_workers=args.prefetch,
+                                  queue_size=args.prefetch_queue, seed=rank_seed)
+
+    rec_loger = []
+    for epoch in range(args.epoch):
+        t1 = time()
+        loss = torch.zeros(3)
+        # same number of steps as main.py, so an epoch still covers n_train triples in total.
+        n_batch = data_generator.n_train // args.batch_size + 1
+
+        for idx in range(n_batch):
+            users, pos_items, neg_items = next(sampler) if sampler is not None else data_generator.sample()
+            u_g_embeddings, pos_i_g_embeddings, neg_i_g_embeddings = ddp_model(users,
+                                                                               pos_items,
+                                                                               neg_items,
+                                                                               drop_flag=args.node_dropout_flag)
+
+            batch_loss, batch_mf_loss, batch_emb_loss = model.create_bpr_loss(u_g_embeddings,
+                                                                              pos_i_g_embeddings,
+                                                                              neg_i_g_embeddings)
+            optimizer.zero_grad()
+            batch_loss.backward()
+            optimizer.step()
+
+            loss += torch.stack([batch_loss, batch_mf_loss, batch_emb_loss]).detach()
+
+        # average the epoch loss over the ranks for logging.
+        dist.all_reduce(loss)
+        loss, mf_loss, emb_loss = (loss / world_size).tolist()
+
+        if (epoch + 1) % 10 != 0:
+            if rank == 0 and args.verbose > 0 and epoch % args.verbose == 0:
+                perf_str = 'Epoch %d [%.1fs]: train==[%.5f=%.5f + %.5f]' % (
+                    epoch, time() - t1, loss, mf_loss, emb_loss)
+                print(perf_str)
+            continue
+
+        should_stop = False
+        if rank == 0:
+            t2 = time()
+            users_to_test = list(data_generator.test_set.keys())
+            ret = test(model, users_to_test, drop_flag=False)
+            t3 = time()
+            rec_loger.append(ret['recall'])
+
+            if args.verbose > 0:
+                perf_str = 'Epoch %d [%.1fs + %.1fs]: train==[%.5f=%.5f + %.5f], recall=[%.5f, %.5f], ' \
+                           'precision=[%.5f, %.5f], hit=[%.5f, %.5f], ndcg=[%.5f, %.5f]' % \
+                           (epoch, t2 - t1, t3 - t2, loss, mf_loss, emb_loss, ret['recall'][0], ret['recall'][-1],
+                            ret['precision'][0], ret['precision'][-1], ret['hit_ratio'][0], ret['hit_ratio'][-1],
+                            ret['ndcg'][0], ret['ndcg'][-1])
+                print(perf_str)
+
+            cur_best_pre_0, stopping_step, should_stop = early_stopping(ret['recall'][0], cur_best_pre_0,
+                                                                        stopping_step, expected_order='acc',
+                                                                        flag_step=5)
+
+            # the state_dict of the wrapped module has the same keys as a checkpoint of main.py.
+            if ret['recall'][0] == cur_best_pre_0 and args.save_flag == 1:
+                ensureDir(args.weights_path)
+                torch.save(model.state_dict(), args.weights_path + str(epoch) + '.pkl')
+                print('save the weights in path: ', args.weights_path + str(epoch) + '.pkl')
+
+        # all ranks stop together on the decision of rank 0.
+        decision = [should_stop]
+        dist.broadcast_object_list(decision, src=0)
+        if decision[0]:
+            break
+
+    if sampler is not None:
+        sampler.close()
+
+    if rank == 0 and rec_loger:
+        recs = np.array(rec_loger)
+        print('Best recall@%d=[%.5f] in [%.1fs] with %d processes' % (Ks[0], recs[:, 0].max(), time() - t0,
+                                                                       world_size))
+    dist.destroy_process_group()
+
+
+if __name__ == '__main__':
+    if 'RANK' in os.environ and 'WORLD_SIZE' in os.environ:
+        # launched by torchrun: one process per rank.
+        run(int(os.environ['RANK']), int(os.environ['WORLD_SIZE']))
+    else:
+        mp.spawn(run, args=(args.world_size,), nprocs=args.world_size, join=True)
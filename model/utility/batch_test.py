@@ -8,111 +8,167 @@ Wang Xiang et al. Neural Graph Collaborative Filtering. In SIGIR 2019.
 import metrics as metrics
 from parser import parse_args
 from load_data import *
-import multiprocessing
-import heapq
-
-cores = multiprocessing.cpu_count() // 2
+import torch
 
 args = parse_args()
 Ks = eval(args.Ks)
 
-data_generator = Data(path=args.data_path + args.dataset, batch_size=args.batch_size)
+data_generator = Data(path=args.data_path + args.dataset, batch_size=args.batch_size, n_neg=args.n_neg,
+                      seed=args.seed)
 USR_NUM, ITEM_NUM = data_generator.n_users, data_generator.n_items
 N_TRAIN, N_TEST = data_generator.n_train, data_generator.n_test
 BATCH_SIZE = args.batch_size
-
-def ranklist_by_heapq(user_pos_test, test_items, rating, Ks):
-    item_score = {}
-    for i in test_items:
-        item_score[i] = rating[i]
-
-    K_max = max(Ks)
-    K_max_item_score = heapq.nlargest(K_max, item_score, key=item_score.get)
-
-    r = []
-    for i in K_max_item_score:
-        if i in user_pos_test:
-            r.append(1)
-        else:
-            r.append(0)
-    auc = 0.
-    return r, auc
-
-def get_auc(item_score, user_pos_test):
-    item_score = sorted(item_score.items(), key=lambda kv: kv[1])
-    item_score.reverse()
-    item_sort = [x[0] for x in item_score]
-    posterior = [x[1] for x in item_score]
-
-    r = []
-    for i in item_sort:
-        if i in user_pos_test:
-            r.append(1)
-        else:
-            r.append(0)
-    auc = metrics.auc(ground_truth=r, prediction=posterior)
+K_MAX = min(max(Ks), ITEM_NUM)
+# scores ranked at once by auc_batch, bounds its float64 rank arrays to 128MB.
+AUC_MAX_ELEMENTS = 2 ** 24
+
+
+def user_item_csr(user_items):
+    # binary users x items CSR matrix from a dict of user -> item list.
+    users = list(user_items.keys())
+    rows = np.repeat(np.array(users, dtype=np.int64), [len(user_items[u]) for u in users])
+    cols = np.array([i for u in users for i in user_items[u]], dtype=np.int64)
+    mat = sp.csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)), shape=(USR_NUM, ITEM_NUM))
+    mat.data[:] = 1.
+    return mat
+
+
+TRAIN_MAT = user_item_csr(data_generator.train_items)
+TEST_MAT = user_item_csr(data_generator.test_set)
+# number of test items (with duplicates, as in recall_at_k) and of distinct test items (as in ndcg_at_k).
+N_TEST_POS = np.zeros(USR_NUM, dtype=np.int64)
+N_TEST_POS[list(data_generator.test_set.keys())] = [len(items) for items in data_generator.test_set.values()]
+N_TEST_GT = np.diff(TEST_MAT.indptr)
+# every test pair encoded as u * ITEM_NUM + i, sorted because CSR is row-major with sorted indices.
+TEST_MAT.sort_indices()
+TEST_KEYS = np.repeat(np.arange(USR_NUM, dtype=np.int64), N_TEST_GT) * ITEM_NUM + TEST_MAT.indices
+
+
+def scatter_rows(mat, user_batch, device):
+    # (row in batch, item) coordinates of the nonzeros of mat for the users in user_batch.
+    sub = mat[user_batch]
+    rows = np.repeat(np.arange(len(user_batch)), np.diff(sub.indptr))
+    return torch.from_numpy(rows).to(device), torch.from_numpy(sub.indices.astype(np.int64)).to(device)
+
+
+def topk_hits(rate_batch, user_batch):
+    """
+    Mask the training items of every user in the batch, take the top max(Ks) items and
+    return the binary hit matrix (len(user_batch), K_MAX).
+    """
+    rate_batch = rate_batch.clone()
+    rows, cols = scatter_rows(TRAIN_MAT, user_batch, rate_batch.device)
+    rate_batch[rows, cols] = -np.inf
+    top_items = torch.topk(rate_batch, K_MAX, dim=1).indices
+    return batch_hits(top_items.cpu().numpy(), user_batch)
+
+
+def streaming_topk_hits(model, user_batch, i_batch_size, drop_flag):
+    """
+    Same result as topk_hits, but the scores are computed one item chunk at a time and merged into a running
+    float32 top-K per user, so memory is O(len(user_batch) x (K_MAX + i_batch_size)) instead of O(users x items).
+    """
+    rows, cols = None, None
+    top_scores, top_items = None, None
+    for i_start in range(0, ITEM_NUM, i_batch_size):
+        i_end = min(i_start + i_batch_size, ITEM_NUM)
+
+        u_g_embeddings, pos_i_g_embeddings, _ = model(user_batch,
+                                                      range(i_start, i_end),
+                                                      [],
+                                                      drop_flag=drop_flag)
+        scores = model.rating(u_g_embeddings, pos_i_g_embeddings).detach().float()
+        if rows is None:
+            rows, cols = scatter_rows(TRAIN_MAT, user_batch, scores.device)
+
+        # mask the training items that fall into this chunk.
+        in_chunk = (cols >= i_start) & (cols < i_end)
+        scores[rows[in_chunk], cols[in_chunk] - i_start] = -np.inf
+        items = torch.arange(i_start, i_end, device=scores.device).expand(len(user_batch), -1)
+
+        if top_scores is not None:
+            scores = torch.cat([top_scores, scores], dim=1)
+            items = torch.cat([top_items, items], dim=1)
+        top_scores, idx = torch.topk(scores, min(K_MAX, scores.shape[1]), dim=1)
+        top_items = items.gather(1, idx)
+
+    return batch_hits(top_items.cpu().numpy(), user_batch)
+
+
+def batch_hits(top_items, user_batch):
+    # binary hit matrix of the ranked items, membership tested against the sorted test pairs.
+    keys = np.asarray(user_batch, dtype=np.int64)[:, None] * ITEM_NUM + top_items
+    pos = np.minimum(np.searchsorted(TEST_KEYS, keys), len(TEST_KEYS) - 1)
+    return (TEST_KEYS[pos] == keys).astype(np.float64)
+
+
+def auc_batch(rate_batch, user_batch):
+    # AUC over the non-training items of every user in the batch. The rank arrays are float64 users x items,
+    # so the users are ranked in chunks of at most AUC_MAX_ELEMENTS scores.
+    scores = np.asarray(torch.as_tensor(rate_batch).cpu())
+    user_batch = np.asarray(user_batch)
+    chunk = max(1, AUC_MAX_ELEMENTS // ITEM_NUM)
+
+    auc = np.zeros(len(user_batch))
+    for start in range(0, len(user_batch), chunk):
+        users = user_batch[start: start + chunk]
+        valid_mask = np.ones((len(users), ITEM_NUM), dtype=bool)
+        valid_mask[TRAIN_MAT[users].nonzero()] = False
+        pos_mask = np.zeros((len(users), ITEM_NUM), dtype=bool)
+        pos_mask[TEST_MAT[users].nonzero()] = True
+        auc[start: start + len(users)] = metrics.auc_batch(scores[start: start + len(users)], pos_mask, valid_mask)
     return auc
 
-def ranklist_by_sorted(user_pos_test, test_items, rating, Ks):
-    item_score = {}
-    for i in test_items:
-        item_score[i] = rating[i]
-
-    K_max = max(Ks)
-    K_max_item_score = heapq.nlargest(K_max, item_score, key=item_score.get)
-
-    r = []
-    for i in K_max_item_score:
-        if i in user_pos_test:
-            r.append(1)
-        else:
-            r.append(0)
-    auc = get_auc(item_score, user_pos_test)
-    return r, auc
-
-def get_performance(user_pos_test, r, auc, Ks):
-    precision, recall, ndcg, hit_ratio = [], [], [], []
-
-    for K in Ks:
-        precision.append(metrics.precision_at_k(r, K))
-        recall.append(metrics.recall_at_k(r, K, len(user_pos_test)))
-        ndcg.append(metrics.ndcg_at_k(r, K, user_pos_test))
-        hit_ratio.append(metrics.hit_at_k(r, K))
 
-    return {'recall': np.array(recall), 'precision': np.array(precision),
-            'ndcg': np.array(ndcg), 'hit_ratio': np.array(hit_ratio), 'auc': auc}
-
-
-def test_one_user(x):
-    # user u's ratings for user u
-    rating = x[0]
-    #uid
-    u = x[1]
-    #user u's items in the training set
-    try:
-        training_items = data_generator.train_items[u]
-    except Exception:
-        training_items = []
-    #user u's items in the test set
-    user_pos_test = data_generator.test_set[u]
-
-    all_items = set(range(ITEM_NUM))
-
-    test_items = list(all_items - set(training_items))
-
-    if args.test_flag == 'part':
-        r, auc = ranklist_by_heapq(user_pos_test, test_items, rating, Ks)
-    else:
-        r, auc = ranklist_by_sorted(user_pos_test, test_items, rating, Ks)
-
-    return get_performance(user_pos_test, r, auc, Ks)
-
-
-def test(model, users_to_test, drop_flag=False, batch_test_flag=False):
+def get_performance_batch(hits, user_batch, Ks):
+    # per-user metrics of a batch, every value is an array of shape (len(user_batch), len(Ks)).
+    n_pos, n_gt = N_TEST_POS[user_batch], N_TEST_GT[user_batch]
+    return {'recall': np.stack([metrics.recall_at_k_batch(hits, K, n_pos) for K in Ks], axis=1),
+            'precision': np.stack([metrics.precision_at_k_batch(hits, K) for K in Ks], axis=1),
+            'ndcg': np.stack([metrics.ndcg_at_k_batch(hits, K, n_gt) for K in Ks], axis=1),
+            'hit_ratio': np.stack([metrics.hit_at_k_batch(hits, K) for K in Ks], axis=1)}
+
+
+def accumulate_batch(result, batch_result, n_test_users, user_results=None):
+    for key in ['precision', 'recall', 'ndcg', 'hit_ratio', 'auc']:
+        result[key] += batch_result[key].sum(axis=0) / n_test_users
+        if user_results is not None:
+            user_results[key].append(batch_result[key])
+
+
+def sparsity_report(ret, users_to_test, split_uids, split_state):
+    """
+    Average the per-user metrics of one test(..., per_user=True) call over the sparsity groups
+    of Data.get_sparsity_split, without scoring the users again.
+    :return: list of dicts, one per group, with the group description, its size and the metrics
+    """
+    rows = np.full(USR_NUM, -1, dtype=np.int64)
+    rows[users_to_test] = np.arange(len(users_to_test))
+
+    report = []
+    for uids, state in zip(split_uids, split_state):
+        group_rows = rows[uids]
+        group_rows = group_rows[group_rows >= 0]
+        group = {'state': state, 'n_users': int(len(group_rows))}
+        for key, values in ret['per_user'].items():
+            mean = values[group_rows].mean(axis=0) if len(group_rows) else np.zeros(values.shape[1:])
+            group[key] = mean.tolist()
+        report.append(group)
+    return report
+
+
+def test(model, users_to_test, drop_flag=False, batch_test_flag=False, per_user=False):
+    # with per_user, result['per_user'] also holds the metrics of every user, in the order of users_to_test.
     result = {'precision': np.zeros(len(Ks)), 'recall': np.zeros(len(Ks)), 'ndcg': np.zeros(len(Ks)),
               'hit_ratio': np.zeros(len(Ks)), 'auc': 0.}
 
-    pool = multiprocessing.Pool(cores)
+    # the ranking is computed for whole user batches with torch.topk, the full ranking adds the AUC from rank
+    # statistics.
+    full_ranking = args.test_flag == 'full'
+
+    # evaluate without message dropout; with drop_flag=False the propagation is computed once per call.
+    training = model.training
+    model.eval()
 
     u_batch_size = BATCH_SIZE * 2
     i_batch_size = BATCH_SIZE
@@ -122,17 +178,29 @@ def test(model, users_to_test, drop_flag=False, batch_test_flag=False):
     n_user_batchs = n_test_users // u_batch_size + 1
 
     count = 0
+    user_results = {key: [] for key in result} if per_user else None
 
     for u_batch_id in range(n_user_batchs):
         start = u_batch_id * u_batch_size
         end = (u_batch_id + 1) * u_batch_size
 
         user_batch = test_users[start: end]
+        if len(user_batch) == 0:
+            continue
+
+        if batch_test_flag and not full_ranking:
+            # batch-item test, streamed into a running top-K.
+            hits = streaming_topk_hits(model, user_batch, i_batch_size, drop_flag)
+            count += len(user_batch)
+            batch_result = get_performance_batch(hits, user_batch, Ks)
+            batch_result['auc'] = np.zeros(len(user_batch))
+            accumulate_batch(result, batch_result, n_test_users, user_results)
+            continue
 
         if batch_test_flag:
             # batch-item test
             n_item_batchs = ITEM_NUM // i_batch_size + 1
-            rate_batch = np.zeros(shape=(len(user_batch), ITEM_NUM))
+            rate_batch = np.zeros(shape=(len(user_batch), ITEM_NUM), dtype=np.float32)
 
             i_count = 0
             for i_batch_id in range(n_item_batchs):
@@ -168,26 +236,22 @@ def test(model, users_to_test, drop_flag=False, batch_test_flag=False):
                                                               item_batch,
                                                               [],
                                                               drop_flag=False)
-                rate_batch = model.rating(u_g_embeddings, pos_i_g_embeddings).detach().cpu()
+                rate_batch = model.rating(u_g_embeddings, pos_i_g_embeddings).detach()
             else:
                 u_g_embeddings, pos_i_g_embeddings, _ = model(user_batch,
                                                               item_batch,
                                                               [],
                                                               drop_flag=True)
-                rate_batch = model.rating(u_g_embeddings, pos_i_g_embeddings).detach().cpu()
-
-        user_batch_rating_uid = zip(rate_batch.numpy(), user_batch)
-        batch_result = pool.map(test_one_user, user_batch_rating_uid)
-        count += len(batch_result)
-
-        for re in batch_result:
-            result['precision'] += re['precision']/n_test_users
-            result['recall'] += re['recall']/n_test_users
-            result['ndcg'] += re['ndcg']/n_test_users
-            result['hit_ratio'] += re['hit_ratio']/n_test_users
-            result['auc'] += re['auc']/n_test_users
+                rate_batch = model.rating(u_g_embeddings, pos_i_g_embeddings).detach()
 
+        hits = topk_hits(torch.as_tensor(rate_batch), user_batch)
+        count += len(user_batch)
+        batch_result = get_performance_batch(hits, user_batch, Ks)
+        batch_result['auc'] = auc_batch(rate_batch, user_batch) if full_ranking else np.zeros(len(user_batch))
+        accumulate_batch(result, batch_result, n_test_users, user_results)
 
     assert count == n_test_users
-    pool.close()
+    if per_user:
+        result['per_user'] = {key: np.concatenate(values) for key, values in user_results.items()}
+    model.train(training)
     return result
@@ -0,0 +1,87 @@
+'''
+Training throughput benchmarks for NGCF: compare the fp32 baseline with the fast (bf16 / compiled) mode.
+'''
+import copy
+from time import time
+
+import numpy as np
+import torch
+import torch.optim as optim
+
+
+def train_throughput(model, data_generator, args, n_epochs):
+    """
+    Train the model for n_epochs and measure the training speed.
+    :return: training samples (user, pos, neg triples) per second
+    """
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+    n_batch = data_generator.n_train // args.batch_size + 1
+    n_samples = 0
+
+    t0 = time()
+    for epoch in range(n_epochs):
+        for idx in range(n_batch):
+            users, pos_items, neg_items = data_generator.sample()
+            u_g_embeddings, pos_i_g_embeddings, neg_i_g_embeddings = model(users,
+                                                                           pos_items,
+                                                                           neg_items,
+                                                                           drop_flag=args.node_dropout_flag)
+            batch_loss, _, _ = model.create_bpr_loss(u_g_embeddings, pos_i_g_embeddings, neg_i_g_embeddings)
+            optimizer.zero_grad()
+            batch_loss.backward()
+            optimizer.step()
+            n_samples += len(users)
+    return n_samples / (time() - t0)
+
+
+def compare_modes(build_model, evaluate, data_generator, args, Ks):
+    """
+    Train the fp32 baseline and the configured fast mode from the same initialization for args.epoch epochs,
+    and report samples/sec and recall@Ks[0] of both.
+    :param build_model: function args -> NGCF model on the target device
+    :param evaluate: function model -> result dict of batch_test.test
+    """
+    modes = [('fp32', 'none', 0), ('fast', args.amp, args.compile)]
+    seed = 2019 if args.seed is None else args.seed
+
+    results = []
+    for name, amp, compile_flag in modes:
+        mode_args = copy.copy(args)
+        mode_args.amp, mode_args.compile = amp, compile_flag
+
+        torch.manual_seed(seed)
+        data_generator.rng = np.random.default_rng(seed)
+        model = build_model(mode_args)
+
+        samples_per_sec = train_throughput(model, data_generator, mode_args, args.epoch)
+        ret = evaluate(model)
+        results.append({'mode': name, 'amp': amp, 'compile': compile_flag,
+                        'samples_per_sec': samples_per_sec, 'recall': ret['recall'][0]})
+
+    base = results[0]['samples_per_sec']
+    for r in results:
+        print('%-5s amp=%-5s compile=%d: %.1f samples/sec (x%.2f), recall@%d=%.5f' %
+              (r['mode'], r['amp'], r['compile'], r['samples_per_sec'], r['samples_per_sec'] / base, Ks[0],
+               r['recall']))
+    return results
+
+
+def thread_scaling(build_model, data_generator, args, max_threads):
+    """
+    Measure training samples/sec with 1..max_threads intra-op threads, one epoch each.
+    """
+    seed = 2019 if args.seed is None else args.seed
+    results = []
+    for n_threads in range(1, max_threads + 1):
+        torch.set_num_threads(n_threads)
+        torch.manual_seed(seed)
+        data_generator.rng = np.random.default_rng(seed)
+        model = build_model(args)
+
+        samples_per_sec = train_throughput(model, data_generator, args, 1)
+        results.append({'threads': n_threads, 'samples_per_sec': samples_per_sec})
+
+        base = results[0]['samples_per_sec']
+        print('threads=%d: %.1f samples/sec, speedup x%.2f, efficiency %.0f%%' %
+              (n_threads, samples_per_sec, samples_per_sec / base, 100. * samples_per_sec / base / n_threads))
+    return results
@@ -5,15 +5,44 @@ Wang Xiang et al. Neural Graph Collaborative Filtering. In SIGIR 2019.
 
 @author: Xiang Wang (xiangwang@u.nus.edu)
 '''
+import os
 import numpy as np
 import random as rd
 import scipy.sparse as sp
 from time import time
 
+# version of the binary layout of data_cache.npz; bump it when read_user_items changes.
+CACHE_VERSION = 1
+
+
+def read_user_items(file_name):
+    """
+    Parse a `uid item item ...` file in one pass, lines without items are skipped.
+    :return: (users, indptr, items) int32 arrays, the items of users[k] are items[indptr[k]:indptr[k+1]]
+    """
+    with open(file_name) as f:
+        lines = [line.split() for line in f]
+    lines = [tokens for tokens in lines if len(tokens) > 1]
+    if not lines:
+        return np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+    lengths = np.fromiter((len(tokens) for tokens in lines), dtype=np.int64, count=len(lines))
+    tokens = np.array([token for line in lines for token in line]).astype(np.int32)
+
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    is_user = np.zeros(len(tokens), dtype=bool)
+    is_user[starts] = True
+    indptr = np.concatenate([[0], np.cumsum(lengths - 1)]).astype(np.int32)
+    return tokens[is_user], indptr, tokens[~is_user]
+
+
 class Data(object):
-    def __init__(self, path, batch_size):
+    def __init__(self, path, batch_size, n_neg=1, seed=None):
         self.path = path
         self.batch_size = batch_size
+        # number of negative items sampled for every positive (user, item) pair.
+        self.n_neg = n_neg
+        self.rng = np.random.default_rng(seed)
 
         train_file = path + '/train.txt'
         test_file = path + '/test.txt'
@@ -23,62 +52,78 @@ class Data(object):
         self.n_train, self.n_test = 0, 0
         self.neg_pools = {}
 
-        self.exist_users = []
-
-        with open(train_file) as f:
-            for l in f.readlines():
-                if len(l) > 0:
-                    l = l.strip('\n').split(' ')
-                    items = [int(i) for i in l[1:]]
-                    uid = int(l[0])
-                    self.exist_users.append(uid)
-                    self.n_items = max(self.n_items, max(items))
-                    self.n_users = max(self.n_users, uid)
-                    self.n_train += len(items)
-
-        with open(test_file) as f:
-            for l in f.readlines():
-                if len(l) > 0:
-                    l = l.strip('\n')
-                    try:
-                        items = [int(i) for i in l.split(' ')[1:]]
-                    except Exception:
-                        continue
-                    self.n_items = max(self.n_items, max(items))
-                    self.n_test += len(items)
-        self.n_items += 1
-        self.n_users += 1
+        # every file is parsed once into (users, indptr, items) int32 arrays: the items of users[k]
+        # are items[indptr[k]:indptr[k+1]].
+        (train_users, train_indptr, train_flat), (test_users, test_indptr, test_flat) = \
+            self.load_user_items(train_file, test_file)
 
-        self.print_statistics()
+        self.exist_users = train_users.tolist()
+        self.n_users = int(train_users.max()) + 1
+        self.n_items = int(max(train_flat.max(), test_flat.max() if len(test_flat) else 0)) + 1
+        self.n_train, self.n_test = len(train_flat), len(test_flat)
 
-        self.R = sp.dok_matrix((self.n_users, self.n_items), dtype=np.float32)
+        self.print_statistics()
 
-        self.train_items, self.test_set = {}, {}
-        with open(train_file) as f_train:
-            with open(test_file) as f_test:
-                for l in f_train.readlines():
-                    if len(l) == 0:
-                        break
-                    l = l.strip('\n')
-                    items = [int(i) for i in l.split(' ')]
-                    uid, train_items = items[0], items[1:]
+        rows = np.repeat(train_users, np.diff(train_indptr))
+        self.R = sp.csr_matrix((np.ones(len(train_flat), dtype=np.float32), (rows, train_flat)),
+                               shape=(self.n_users, self.n_items))
+        self.R.data[:] = 1.
 
-                    for i in train_items:
-                        self.R[uid, i] = 1.
-                        # self.R[uid][i] = 1
+        self.train_items = self.split_user_items(train_users, train_indptr, train_flat)
+        self.test_set = self.split_user_items(test_users, test_indptr, test_flat)
 
-                    self.train_items[uid] = train_items
+        self.build_sampling_index()
 
-                for l in f_test.readlines():
-                    if len(l) == 0: break
-                    l = l.strip('\n')
-                    try:
-                        items = [int(i) for i in l.split(' ')]
-                    except Exception:
-                        continue
+    def load_user_items(self, train_file, test_file):
+        # parsed train/test files, read from the binary cache when the source files are unchanged.
+        cache_file = self.path + '/data_cache.npz'
+        stats = [os.stat(f) for f in (train_file, test_file)]
+        source_key = np.array([v for st in stats for v in (st.st_size, st.st_mtime_ns)], dtype=np.int64)
+        try:
+            t1 = time()
+            with np.load(cache_file) as cache:
+                if int(cache['version']) == CACHE_VERSION and np.array_equal(cache['source_key'], source_key):
+                    loaded = tuple((cache[name + '_users'], cache[name + '_indptr'], cache[name + '_items'])
+                                   for name in ('train', 'test'))
+                    print('already load data cache', time() - t1)
+                    return loaded
+        except Exception:
+            pass
 
-                    uid, test_items = items[0], items[1:]
-                    self.test_set[uid] = test_items
+        t1 = time()
+        loaded = (read_user_items(train_file), read_user_items(test_file))
+        print('parse train/test files', time() - t1)
+        try:
+            arrays = {name + suffix: array for name, parsed in zip(('train', 'test'), loaded)
+                      for suffix, array in zip(('_users', '_indptr', '_items'), parsed)}
+            # the Data object is created at import, before torch.distributed is set up, so ranks started
+            # together may all write the cache: each writes its own file, the rename is atomic.
+            tmp_file = cache_file + '.%d.tmp.npz' % os.getpid()
+            np.savez(tmp_file, version=CACHE_VERSION, source_key=source_key, **arrays)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print('failed to save data cache:', e)
+        return loaded
+
+    @staticmethod
+    def split_user_items(users, indptr, items):
+        # dict of user -> item list, later lines of the same user win as in the original loader.
+        items = items.tolist()
+        indptr = indptr.tolist()
+        return {u: items[indptr[k]:indptr[k + 1]] for k, u in enumerate(users.tolist())}
+
+    def build_sampling_index(self):
+        # CSR view of R for the vectorized sampler: the positives of user u are indices[indptr[u]:indptr[u+1]].
+        train_csr = self.R.tocsr()
+        train_csr.sort_indices()
+        self.train_indptr = train_csr.indptr.astype(np.int64)
+        self.train_indices = train_csr.indices.astype(np.int64)
+        self.exist_users_arr = np.array(self.exist_users, dtype=np.int64)
+
+        # every training pair encoded as u * n_items + i; row-major CSR order makes the keys already sorted,
+        # so membership of a batch of (user, item) pairs is a single searchsorted.
+        rows = np.repeat(np.arange(self.n_users, dtype=np.int64), np.diff(self.train_indptr))
+        self.train_keys = rows * self.n_items + self.train_indices
 
     def get_adj_mat(self):
         try:
@@ -97,13 +142,9 @@ class Data(object):
 
     def create_adj_mat(self):
         t1 = time()
-        adj_mat = sp.dok_matrix((self.n_users + self.n_items, self.n_users + self.n_items), dtype=np.float32)
-        adj_mat = adj_mat.tolil()
-        R = self.R.tolil()
-
-        adj_mat[:self.n_users, self.n_users:] = R
-        adj_mat[self.n_users:, :self.n_users] = R.T
-        adj_mat = adj_mat.todok()
+        # bipartite adjacency [[0, R], [R^T, 0]] assembled from the CSR blocks directly.
+        R = self.R.tocsr().astype(np.float32)
+        adj_mat = sp.bmat([[None, R], [R.T, None]], format='csr', dtype=np.float32)
         print('already create adjacency matrix', adj_mat.shape, time() - t1)
 
         t2 = time()
@@ -146,7 +187,7 @@ class Data(object):
         mean_adj_mat = mean_adj_single(adj_mat)
 
         print('already normalize adjacency matrix', time() - t2)
-        return adj_mat.tocsr(), norm_adj_mat.tocsr(), mean_adj_mat.tocsr()
+        return adj_mat, norm_adj_mat.tocsr(), mean_adj_mat.tocsr()
 
     def negative_pool(self):
         t1 = time()
@@ -156,49 +197,41 @@ class Data(object):
             self.neg_pools[u] = pools
         print('refresh negative pools', time() - t1)
 
-    def sample(self):
-        if self.batch_size <= self.n_users:
-            users = rd.sample(self.exist_users, self.batch_size)
-        else:
-            users = [rd.choice(self.exist_users) for _ in range(self.batch_size)]
-
-        def sample_pos_items_for_u(u, num):
-            # sample num pos items for u-th user
-            pos_items = self.train_items[u]
-            n_pos_items = len(pos_items)
-            pos_batch = []
-            while True:
-                if len(pos_batch) == num:
-                    break
-                pos_id = np.random.randint(low=0, high=n_pos_items, size=1)[0]
-                pos_i_id = pos_items[pos_id]
-
-                if pos_i_id not in pos_batch:
-                    pos_batch.append(pos_i_id)
-            return pos_batch
-
-        def sample_neg_items_for_u(u, num):
-            # sample num neg items for u-th user
-            neg_items = []
-            while True:
-                if len(neg_items) == num:
-                    break
-                neg_id = np.random.randint(low=0, high=self.n_items,size=1)[0]
-                if neg_id not in self.train_items[u] and neg_id not in neg_items:
-                    neg_items.append(neg_id)
-            return neg_items
-
-        def sample_neg_items_for_u_from_pools(u, num):
-            neg_items = list(set(self.neg_pools[u]) - set(self.train_items[u]))
-            return rd.sample(neg_items, num)
-
-        pos_items, neg_items = [], []
-        for u in users:
-            pos_items += sample_pos_items_for_u(u, 1)
-            neg_items += sample_neg_items_for_u(u, 1)
+    def sample(self, rng=None):
+        """
+        Draw a batch of (user, positive item, negative item) triples with numpy in one shot.
+        Every sampled user contributes n_neg triples sharing the same positive item.
+        :param rng: numpy Generator to draw from, defaults to self.rng
+        :return: users, pos_items, neg_items as int64 arrays of length batch_size * n_neg
+        """
+        rng = self.rng if rng is None else rng
+        n_exist = len(self.exist_users_arr)
+        users = rng.choice(self.exist_users_arr, self.batch_size, replace=self.batch_size > n_exist)
+
+        # one positive per user, uniformly from the user's CSR row.
+        start = self.train_indptr[users]
+        degree = self.train_indptr[users + 1] - start
+        pos_items = self.train_indices[start + (rng.random(self.batch_size) * degree).astype(np.int64)]
+
+        users = np.repeat(users, self.n_neg)
+        pos_items = np.repeat(pos_items, self.n_neg)
+
+        # uniform negatives; redraw only the ones that hit a training item until none collide.
+        neg_items = rng.integers(0, self.n_items, size=len(users))
+        collide = self.is_train_pair(users, neg_items)
+        while collide.any():
+            redraw = np.flatnonzero(collide)
+            neg_items[redraw] = rng.integers(0, self.n_items, size=len(redraw))
+            collide[redraw] = self.is_train_pair(users[redraw], neg_items[redraw])
 
         return users, pos_items, neg_items
 
+    def is_train_pair(self, users, items):
+        # vectorized membership test of (user, item) pairs in the training set.
+        keys = users * self.n_items + items
+        pos = np.minimum(np.searchsorted(self.train_keys, keys), len(self.train_keys) - 1)
+        return self.train_keys[pos] == keys
+
     def get_num_users_items(self):
         return self.n_users, self.n_items
 
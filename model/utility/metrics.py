@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.stats import rankdata
 from sklearn.metrics import roc_auc_score
 
 
@@ -48,7 +49,7 @@ def dcg_at_k(r, k, method=1):
     Returns:
         Discounted cumulative gain
     """
-    r = np.asfarray(r)[:k]
+    r = np.asarray(r, dtype=np.float64)[:k]
     if r.size:
         if method == 0:
             return r[0] + np.sum(r[1:] / np.log2(np.arange(2, r.size + 1)))
@@ -82,7 +83,7 @@ def ndcg_at_k(r, k, ground_truth, method=1):
 def recall_at_k(r, k, all_pos_num):
     # if all_pos_num == 0:
     #     return 0
-    r = np.asfarray(r)[:k]
+    r = np.asarray(r, dtype=np.float64)[:k]
     return np.sum(r) / all_pos_num
 
 
@@ -93,6 +94,36 @@ def hit_at_k(r, k):
     else:
         return 0.
 
+def precision_at_k_batch(hits, k):
+    """Precision @ k for a batch of users.
+    hits: (n_users, K) binary matrix, row u is r of user u.
+    """
+    return np.mean(hits[:, :k], axis=1)
+
+
+def recall_at_k_batch(hits, k, all_pos_num):
+    """Recall @ k for a batch of users, all_pos_num holds the number of test items of every user."""
+    return np.sum(hits[:, :k], axis=1) / all_pos_num
+
+
+def ndcg_at_k_batch(hits, k, n_ground_truth, method=1):
+    """NDCG @ k for a batch of users, same definition as ndcg_at_k.
+    n_ground_truth holds the number of distinct test items of every user.
+    """
+    if method != 1:
+        raise ValueError('method must be 1.')
+    discount = 1. / np.log2(np.arange(2, k + 2))
+    r = hits[:, :k]
+    dcg = r @ discount[:r.shape[1]]
+    idcg = np.concatenate([[0.], np.cumsum(discount)])[np.minimum(n_ground_truth, k)]
+    return np.divide(dcg, idcg, out=np.zeros_like(dcg), where=idcg > 0)
+
+
+def hit_at_k_batch(hits, k):
+    """Hit ratio @ k for a batch of users."""
+    return np.any(hits[:, :k], axis=1).astype(np.float64)
+
+
 def F1(pre, rec):
     if pre + rec > 0:
         return (2.0 * pre * rec) / (pre + rec)
@@ -104,4 +135,22 @@ def AUC(ground_truth, prediction):
         res = roc_auc_score(y_true=ground_truth, y_score=prediction)
     except Exception:
         res = 0.
-    return res
\ No newline at end of file
+    return res
+
+
+def auc_batch(scores, pos_mask, valid_mask):
+    """Exact AUC for a batch of users from rank statistics (Mann-Whitney U), same value as AUC.
+    scores: (n_users, n_items) predictions; valid_mask marks the ranked items of every user, pos_mask
+    the relevant ones among them. Ties count 1/2 as in roc_auc_score; 0 when a user has no relevant
+    or no irrelevant item.
+    """
+    pos_mask = pos_mask & valid_mask
+    # the excluded items get -inf and fill the lowest ranks, which are subtracted below.
+    ranks = rankdata(np.where(valid_mask, scores, -np.inf), axis=1)
+    n_excluded = np.sum(~valid_mask, axis=1)
+    n_pos = np.sum(pos_mask, axis=1)
+    n_neg = np.sum(valid_mask, axis=1) - n_pos
+
+    u = np.sum(ranks * pos_mask, axis=1) - n_pos * n_excluded - n_pos * (n_pos + 1) / 2.
+    denom = (n_pos * n_neg).astype(np.float64)
+    return np.divide(u, denom, out=np.zeros_like(denom), where=denom > 0)
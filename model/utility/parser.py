@@ -31,6 +31,14 @@ def parse_args():
                         help='Output sizes of every layer')
     parser.add_argument('--batch_size', type=int, default=1024,
                         help='Batch size.')
+    parser.add_argument('--n_neg', type=int, default=1,
+                        help='Number of negative items sampled for every positive pair.')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='Number of background sampling threads, 0 (default): sample synchronously in the training loop.')
+    parser.add_argument('--prefetch_queue', type=int, default=4,
+                        help='Number of batches prefetched ahead of the training loop.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the training batch sampler.')
 
     parser.add_argument('--regs', nargs='?', default='[1e-5]',
                         help='Regularizations.')
@@ -40,9 +48,16 @@ def parse_args():
     parser.add_argument('--model_type', nargs='?', default='ngcf',
                         help='Specify the name of model (ngcf).')
     parser.add_argument('--adj_type', nargs='?', default='norm',
-                        help='Specify the type of the adjacency (laplacian) matrix from {plain, norm, mean}.')
+                        help='Specify the type of the adjacency (laplacian) matrix from {plain, norm, gcmc, mean}.')
 
-    parser.add_argument('--gpu_id', type=int, default=6)
+    parser.add_argument('--gpu_id', type=int, default=0,
+                        help='GPU to train on, -1: Train on CPU (also used when CUDA is unavailable).')
+    parser.add_argument('--num_threads', type=int, default=0,
+                        help='Intra-op threads for CPU training, 0: PyTorch default (one per physical core).')
+    parser.add_argument('--num_interop_threads', type=int, default=0,
+                        help='Inter-op threads for CPU training, 0: PyTorch default.')
+    parser.add_argument('--world_size', type=int, default=2,
+                        help='Number of training processes started by main_ddp.py when not launched by torchrun.')
 
     parser.add_argument('--node_dropout_flag', type=int, default=1,
                         help='0: Disable node dropout, 1: Activate node dropout')
@@ -60,6 +75,17 @@ def parse_args():
     parser.add_argument('--test_flag', nargs='?', default='part',
                         help='Specify the test type from {part, full}, indicating whether the reference is done in mini-batch')
 
+    parser.add_argument('--amp', nargs='?', default='none',
+                        help='Precision of the dense propagation and BPR loss from {none, bf16}.')
+    parser.add_argument('--compile', type=int, default=0,
+                        help='0: Eager forward, 1: Compile the forward with torch.compile')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='1: Train the fp32 baseline and the --amp/--compile mode for --epoch epochs each and '
+                             'report samples/sec and recall')
+    parser.add_argument('--benchmark_threads', type=int, default=0,
+                        help='N > 0: Measure training samples/sec with 1..N intra-op threads and exit.')
+
     parser.add_argument('--report', type=int, default=0,
-                        help='0: Disable performance report w.r.t. sparsity levels, 1: Show performance report w.r.t. sparsity levels')
+                        help='0: Disable performance report w.r.t. sparsity levels, 1: Show performance report w.r.t. sparsity levels '
+                             'and write it to <proj_path>report/<dataset>/ngcf.json')
     return parser.parse_args()
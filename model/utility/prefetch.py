@@ -0,0 +1,75 @@
+'''
+Background prefetching of training batches: sampling runs on worker threads and overlaps with the
+forward/backward pass of the model.
+'''
+import queue
+import threading
+
+import numpy as np
+import torch
+
+
+class PrefetchSampler(object):
+    """
+    Producer/consumer wrapper around Data.sample.
+
+    Every worker owns a numpy Generator spawned from one SeedSequence and fills its own bounded queue
+    with ready-made (pinned, when training on GPU) tensors. Batches are consumed round-robin over the
+    workers, so the stream of batches is the same for a given seed no matter how the threads are scheduled.
+    """
+
+    def __init__(self, data_generator, device, n_workers=1, queue_size=4, seed=None):
+        """
+        :param data_generator: load_data.Data instance
+        :param device: torch device the batches are moved to
+        :param n_workers: number of sampling threads
+        :param queue_size: total number of batches buffered ahead of the consumer
+        :param seed: seed of the worker generators, None for a random seed
+        """
+        self.data_generator = data_generator
+        self.device = device
+        self.pin_memory = device.type == 'cuda'
+
+        self._stop = threading.Event()
+        self._queues = [queue.Queue(maxsize=max(1, queue_size // n_workers)) for _ in range(n_workers)]
+        self._next_worker = 0
+
+        seeds = np.random.SeedSequence(seed).spawn(n_workers)
+        self._workers = [threading.Thread(target=self._produce, args=(q, np.random.default_rng(s)), daemon=True)
+                         for q, s in zip(self._queues, seeds)]
+        for worker in self._workers:
+            worker.start()
+
+    def _produce(self, batch_queue, rng):
+        while not self._stop.is_set():
+            try:
+                batch = tuple(torch.from_numpy(x) for x in self.data_generator.sample(rng))
+                if self.pin_memory:
+                    batch = tuple(t.pin_memory() for t in batch)
+            except Exception as e:
+                # hand the error to the consumer instead of dying silently.
+                batch = e
+
+            while not self._stop.is_set():
+                try:
+                    batch_queue.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if isinstance(batch, Exception):
+                return
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batch = self._queues[self._next_worker].get()
+        self._next_worker = (self._next_worker + 1) % len(self._queues)
+        if isinstance(batch, Exception):
+            raise batch
+        return tuple(t.to(self.device, non_blocking=True) for t in batch)
+
+    def close(self):
+        self._stop.set()
+        for worker in self._workers:
+            worker.join()
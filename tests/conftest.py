@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the model code imports its modules by their plain names, as when it is run from model/.
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model')
+for path in (MODEL_DIR, os.path.join(MODEL_DIR, 'utility')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,90 @@
+import copy
+import importlib
+import sys
+
+import numpy as np
+import pytest
+import torch
+
+from NGCF import NGCF
+
+
+@pytest.fixture(scope='module')
+def batch_test(tmp_path_factory):
+    # batch_test parses the command line and loads the dataset at import, so it is imported once
+    # against a small generated dataset.
+    root = tmp_path_factory.mktemp('data')
+    (root / 'ds').mkdir()
+    rng = np.random.default_rng(0)
+    n_users, n_items = 120, 90
+    with open(root / 'ds' / 'train.txt', 'w') as f_train, open(root / 'ds' / 'test.txt', 'w') as f_test:
+        for u in range(n_users):
+            items = rng.choice(n_items, rng.integers(4, 20), replace=False)
+            f_train.write(' '.join(map(str, [u] + items[3:].tolist())) + '\n')
+            f_test.write(' '.join(map(str, [u] + items[:3].tolist())) + '\n')
+
+    argv = sys.argv
+    sys.argv = ['batch_test', '--data_path', str(root) + '/', '--dataset', 'ds', '--Ks', '[5,10]',
+                '--batch_size', '16', '--embed_size', '16', '--layer_size', '[16,16]']
+    try:
+        return importlib.import_module('batch_test')
+    finally:
+        sys.argv = argv
+
+
+@pytest.fixture(scope='module')
+def model(batch_test):
+    args = copy.copy(batch_test.args)
+    args.device = torch.device('cpu')
+    args.node_dropout = eval(args.node_dropout)
+    args.mess_dropout = eval(args.mess_dropout)
+    torch.manual_seed(0)
+    _, norm_adj, _ = batch_test.data_generator.create_adj_mat()
+    model = NGCF(batch_test.USR_NUM, batch_test.ITEM_NUM, norm_adj, args)
+    model.eval()
+    return model
+
+
+def full_scores(model, users, n_items):
+    with torch.no_grad():
+        u_g_embeddings, i_g_embeddings, _ = model(users, range(n_items), [], drop_flag=False)
+        return model.rating(u_g_embeddings, i_g_embeddings)
+
+
+def test_topk_hits_matches_per_user_ranking(batch_test, model):
+    data = batch_test.data_generator
+    users = list(data.test_set.keys())
+    hits = batch_test.topk_hits(full_scores(model, users, batch_test.ITEM_NUM), users)
+
+    scores = full_scores(model, users, batch_test.ITEM_NUM).numpy()
+    for row, u in enumerate(users):
+        user_scores = scores[row].copy()
+        user_scores[data.train_items[u]] = -np.inf
+        ranked = np.argsort(-user_scores, kind='stable')[:batch_test.K_MAX]
+        np.testing.assert_array_equal(hits[row], [float(i in data.test_set[u]) for i in ranked])
+
+
+@pytest.mark.parametrize('i_batch_size', [1, 7, 16, 1000])
+def test_streaming_topk_hits_matches_topk_hits(batch_test, model, i_batch_size):
+    users = list(batch_test.data_generator.test_set.keys())[:50]
+    expected = batch_test.topk_hits(full_scores(model, users, batch_test.ITEM_NUM), users)
+    with torch.no_grad():
+        hits = batch_test.streaming_topk_hits(model, users, i_batch_size, drop_flag=False)
+    np.testing.assert_array_equal(hits, expected)
+
+
+def test_auc_batch_matches_per_user_auc(batch_test, model, monkeypatch):
+    data = batch_test.data_generator
+    users = list(data.test_set.keys())
+    scores = full_scores(model, users, batch_test.ITEM_NUM)
+
+    expected = []
+    for row, u in enumerate(users):
+        items = np.setdiff1d(np.arange(batch_test.ITEM_NUM), data.train_items[u])
+        r = [int(i in data.test_set[u]) for i in items]
+        expected.append(batch_test.metrics.AUC(ground_truth=r, prediction=scores[row, items].numpy()))
+
+    np.testing.assert_allclose(batch_test.auc_batch(scores, users), expected)
+    # ranked in chunks of a few users when the score matrix is larger than AUC_MAX_ELEMENTS.
+    monkeypatch.setattr(batch_test, 'AUC_MAX_ELEMENTS', 3 * batch_test.ITEM_NUM)
+    np.testing.assert_allclose(batch_test.auc_batch(scores, users), expected)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from load_data import Data
+
+
+def write_dataset(path, rng, n_users=40, n_items=30):
+    train, test = [], []
+    for u in rng.permutation(n_users)[:n_users - 3]:  # some user ids have no interactions
+        items = rng.choice(n_items, rng.integers(1, 8), replace=False).tolist()
+        if u % 7 == 0:
+            items.append(items[0])  # a duplicated training item counts once
+        train.append([u] + items)
+        if u % 3:
+            test.append([u] + rng.choice(n_items, rng.integers(1, 4), replace=False).tolist())
+    for name, lines in (('train.txt', train), ('test.txt', test)):
+        with open(path / name, 'w') as f:
+            f.write('\n'.join(' '.join(map(str, line)) for line in lines) + '\n')
+    return train, test
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    train, test = write_dataset(tmp_path, np.random.default_rng(0))
+    return str(tmp_path), train, test
+
+
+def test_parsed_data_matches_text_files(dataset):
+    path, train, test = dataset
+    data = Data(path, batch_size=16)
+
+    assert data.n_users == max(line[0] for line in train) + 1
+    assert data.n_items == max(max(line[1:]) for line in train + test) + 1
+    assert data.n_train == sum(len(line) - 1 for line in train)
+    assert data.n_test == sum(len(line) - 1 for line in test)
+    assert data.train_items == {line[0]: line[1:] for line in train}
+    assert data.test_set == {line[0]: line[1:] for line in test}
+
+    R = np.zeros((data.n_users, data.n_items), dtype=np.float32)
+    for line in train:
+        R[line[0], line[1:]] = 1.
+    np.testing.assert_array_equal(data.R.toarray(), R)
+
+
+def test_data_cache_round_trip(dataset, capsys):
+    path, _, _ = dataset
+    parsed = Data(path, batch_size=16)
+    cached = Data(path, batch_size=16)
+    assert 'already load data cache' in capsys.readouterr().out
+    assert cached.train_items == parsed.train_items and cached.test_set == parsed.test_set
+    assert (cached.R != parsed.R).nnz == 0
+
+
+def original_adj_mats(R, n_users, n_items):
+    # the construction of the original loader: lil assignment of the R blocks, then D^-1 * A.
+    adj_mat = sp.dok_matrix((n_users + n_items, n_users + n_items), dtype=np.float32).tolil()
+    adj_mat[:n_users, n_users:] = R.tolil()
+    adj_mat[n_users:, :n_users] = R.tolil().T
+    adj_mat = adj_mat.todok()
+
+    def mean_adj_single(adj):
+        d_inv = np.power(np.array(adj.sum(1)), -1).flatten()
+        d_inv[np.isinf(d_inv)] = 0.
+        return sp.diags(d_inv).dot(adj).tocoo()
+
+    norm_adj_mat = mean_adj_single(adj_mat + sp.eye(adj_mat.shape[0]))
+    mean_adj_mat = mean_adj_single(adj_mat)
+    return adj_mat.tocsr(), norm_adj_mat.tocsr(), mean_adj_mat.tocsr()
+
+
+def test_adjacency_matches_original_construction(dataset):
+    path, _, _ = dataset
+    data = Data(path, batch_size=16)
+
+    # users without training items have a zero degree in both constructions.
+    with np.errstate(divide='ignore'):
+        expected = original_adj_mats(data.R, data.n_users, data.n_items)
+        created = data.create_adj_mat()
+    for matrix, reference in zip(created, expected):
+        assert matrix.shape == reference.shape
+        np.testing.assert_allclose(matrix.toarray(), reference.toarray(), rtol=1e-6)
+
+    # get_adj_mat saves the matrices and loads the same ones the next time.
+    with np.errstate(divide='ignore'):
+        saved = data.get_adj_mat()
+    loaded = Data(path, batch_size=16).get_adj_mat()
+    for matrix, reference in zip(loaded, saved):
+        assert (matrix != reference).nnz == 0
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def hits():
+    rng = np.random.default_rng(0)
+    hits = (rng.random((200, 20)) < 0.2).astype(np.float64)
+    hits[:5] = 0.
+    hits[5:10] = 1.
+    # number of test items of every user, never less than its hits in the top 20.
+    n_ground_truth = hits.sum(axis=1).astype(np.int64) + rng.integers(0, 25, len(hits))
+    n_ground_truth[n_ground_truth == 0] = 1
+    return hits, n_ground_truth
+
+
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_batch_metrics_match_per_user_metrics(hits, k):
+    hits, n_ground_truth = hits
+
+    np.testing.assert_allclose(metrics.precision_at_k_batch(hits, k),
+                               [metrics.precision_at_k(r, k) for r in hits])
+    np.testing.assert_allclose(metrics.recall_at_k_batch(hits, k, n_ground_truth),
+                               [metrics.recall_at_k(r, k, n) for r, n in zip(hits, n_ground_truth)])
+    np.testing.assert_allclose(metrics.ndcg_at_k_batch(hits, k, n_ground_truth),
+                               [metrics.ndcg_at_k(r, k, range(n)) for r, n in zip(hits, n_ground_truth)])
+    np.testing.assert_allclose(metrics.hit_at_k_batch(hits, k),
+                               [metrics.hit_at_k(r, k) for r in hits])
+
+
+def test_auc_batch_matches_roc_auc_score():
+    rng = np.random.default_rng(1)
+    n_users, n_items = 50, 40
+    # integer scores, so ties between relevant and irrelevant items are common.
+    scores = rng.integers(0, 6, (n_users, n_items)).astype(np.float64)
+    valid_mask = rng.random((n_users, n_items)) < 0.8
+    pos_mask = rng.random((n_users, n_items)) < 0.2
+    pos_mask[0] = False  # no relevant item
+    pos_mask[1] = valid_mask[1]  # no irrelevant item
+
+    auc = metrics.auc_batch(scores, pos_mask, valid_mask)
+    for u in range(2, n_users):
+        items = np.flatnonzero(valid_mask[u])
+        expected = metrics.AUC(ground_truth=pos_mask[u, items].astype(int), prediction=scores[u, items])
+        assert auc[u] == pytest.approx(expected)
+    # undefined for a single class: 0, like AUC when roc_auc_score raises (newer versions return nan instead).
+    assert auc[0] == auc[1] == 0.
@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+import numpy as np
+
+from data_utils.recommendation_cache import TTLLRUCache, user_tag, RECOMMENDATIONS_TAG
+from data_utils.parking_graph_query import AsyncParkingGraphQuery, recommendations_tags
+from data_utils.user_similarity_index import UserSimilarityIndex
+
+
+def test_invalidate_tag_removes_tagged_entries_only():
+    cache = TTLLRUCache(maxsize=10, ttl=60)
+    cache.set('a', 1, tags=recommendations_tags(1))
+    cache.set('b', 2, tags=recommendations_tags(2))
+    cache.set('park', 3)
+
+    assert cache.invalidate_tag(user_tag(1)) == 1
+    assert cache.get('a') == (False, None)
+    assert cache.get('b') == (True, 2)
+
+    assert cache.invalidate_tag(RECOMMENDATIONS_TAG) == 1
+    assert cache.get('b') == (False, None)
+    assert cache.get('park') == (True, 3)
+
+
+def test_generation_guard_drops_stale_fills():
+    cache = TTLLRUCache(maxsize=10, ttl=60)
+
+    # 查询期间该用户的标签被失效：旧结果不能写入
+    generation = cache.generation()
+    cache.invalidate_tag(user_tag(1))
+    assert not cache.set('a', 'stale', tags=recommendations_tags(1), generation=generation)
+    assert cache.get('a') == (False, None)
+
+    # 其他用户的失效不影响本次写入
+    generation = cache.generation()
+    cache.invalidate_tag(user_tag(2))
+    assert cache.set('a', 'fresh', tags=recommendations_tags(1), generation=generation)
+    assert cache.get('a') == (True, 'fresh')
+
+    # 全部推荐结果失效或清空缓存时，同样拒绝写入
+    generation = cache.generation()
+    cache.invalidate_tag(RECOMMENDATIONS_TAG)
+    assert not cache.set('b', 'stale', tags=recommendations_tags(3), generation=generation)
+    generation = cache.generation()
+    cache.clear()
+    assert not cache.set('park', 'stale', generation=generation)
+    assert cache.stats()['stale_writes'] == 3
+
+
+def test_lru_eviction_and_ttl():
+    cache = TTLLRUCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+
+    expired = TTLLRUCache(maxsize=2, ttl=-1)
+    expired.set('a', 1)
+    assert expired.get('a') == (False, None)
+    assert expired.stats()['expirations'] == 1
+
+
+def test_similarity_index_reload_invalidates_recommendations(tmp_path):
+    path = str(tmp_path / 'index.npz')
+    index = UserSimilarityIndex(parking_common=1, threshold_sim=0.)
+    index.build(np.array([0, 1, 0, 1]), np.array([0, 0, 1, 1]), np.array([1., 1., 2., 2.]))
+    index.save(path)
+
+    cache = TTLLRUCache(maxsize=10, ttl=60)
+    query = AsyncParkingGraphQuery(None, similarity_index=UserSimilarityIndex.load(path), cache=cache)
+    cache.set('recommendations', [], tags=recommendations_tags(0))
+    cache.set('park', 1)
+
+    assert not asyncio.run(query.refresh_similarity_index())
+    assert cache.get('recommendations') == (True, [])
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert asyncio.run(query.refresh_similarity_index())
+    assert cache.get('recommendations') == (False, None)
+    assert cache.get('park') == (True, 1)
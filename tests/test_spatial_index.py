@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from data_utils.spatial_index import GridSpatialIndex, haversine, parse_location
+
+
+def random_spots(rng, n=2000):
+    # 大约 20km × 20km 的城市范围
+    ids = rng.permutation(10 * n)[:n]
+    longitudes = 114.0 + rng.random(n) * 0.2
+    latitudes = 22.5 + rng.random(n) * 0.18
+    return ids, longitudes, latitudes
+
+
+@pytest.mark.parametrize('cell_size', [200., 500., 5000.])
+@pytest.mark.parametrize('radius', [0., 300., 1500., 30000.])
+def test_query_radius_matches_brute_force(cell_size, radius):
+    rng = np.random.default_rng(0)
+    ids, longitudes, latitudes = random_spots(rng)
+    index = GridSpatialIndex(cell_size=cell_size)
+    index.rebuild(ids, longitudes, latitudes)
+    assert len(index) == len(ids)
+
+    for longitude, latitude in zip(114.0 + rng.random(20) * 0.2, 22.5 + rng.random(20) * 0.18):
+        found_ids, found_distances = index.query_radius(longitude, latitude, radius)
+
+        distances = haversine(longitude, latitude, longitudes, latitudes)
+        expected = np.flatnonzero(distances <= radius)
+        assert sorted(found_ids.tolist()) == sorted(ids[expected].tolist())
+        assert np.all(np.diff(found_distances) >= 0)
+        np.testing.assert_allclose(found_distances, np.sort(distances[expected]))
+
+
+def test_query_on_empty_index():
+    index = GridSpatialIndex()
+    found_ids, found_distances = index.query_radius(114.0, 22.5, 1000.)
+    assert len(index) == 0 and len(found_ids) == 0 and len(found_distances) == 0
+
+
+def test_parse_location():
+    assert parse_location('114.05, 22.55') == (114.05, 22.55)
+    with pytest.raises(ValueError):
+        parse_location('114.05')
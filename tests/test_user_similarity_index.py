@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+from data_utils.user_similarity_index import UserSimilarityIndex
+
+
+def random_ratings(rng, n, n_users=60, n_spots=25):
+    user_ids = rng.integers(0, n_users, n)
+    spot_ids = rng.integers(0, n_spots, n)
+    grades = rng.integers(1, 6, n).astype(np.float32)
+    return user_ids, spot_ids, grades
+
+
+def new_index():
+    # 阈值放低，使相似用户足够多，top_k 截断也会生效
+    return UserSimilarityIndex(top_k=5, parking_common=2, threshold_sim=0.5, block_size=16)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_incremental_update_matches_full_build(seed):
+    rng = np.random.default_rng(seed)
+    user_ids, spot_ids, grades = random_ratings(rng, 900)
+    # 新评分里既有新用户、新停车场，也有对已有评分的覆盖
+    new_user_ids, new_spot_ids, new_grades = random_ratings(rng, 60, n_users=70, n_spots=30)
+    new_user_ids[:10], new_spot_ids[:10] = user_ids[:10], spot_ids[:10]
+
+    incremental = new_index()
+    incremental.build(user_ids, spot_ids, grades)
+    incremental.update(new_user_ids, new_spot_ids, new_grades)
+
+    full = new_index()
+    full.build(np.concatenate([user_ids, new_user_ids]), np.concatenate([spot_ids, new_spot_ids]),
+               np.concatenate([grades, new_grades]))
+
+    assert incremental.ratings.shape == full.ratings.shape
+    assert (incremental.ratings != full.ratings).nnz == 0
+    np.testing.assert_allclose(incremental.similarity.toarray(), full.similarity.toarray(), rtol=1e-6)
+    for user_id in range(full.similarity.shape[0]):
+        assert incremental.neighbors(user_id) == pytest.approx(full.neighbors(user_id))
+
+
+def test_neighbors_are_sorted_and_filtered():
+    rng = np.random.default_rng(3)
+    index = new_index()
+    index.build(*random_ratings(rng, 900))
+
+    for user_id in range(index.similarity.shape[0]):
+        neighbors = index.neighbors(user_id, k=3, threshold_sim=0.8)
+        sims = [neighbor['sim'] for neighbor in neighbors]
+        assert len(neighbors) <= 3
+        assert sims == sorted(sims, reverse=True)
+        assert all(sim > 0.8 for sim in sims)
+        assert user_id not in [neighbor['id'] for neighbor in neighbors]
+    assert index.neighbors(-1) == [] and index.neighbors(10 ** 6) == []
+
+
+def test_save_load_and_refresh(tmp_path):
+    rng = np.random.default_rng(4)
+    path = str(tmp_path / 'index.npz')
+    index = new_index()
+    index.build(*random_ratings(rng, 900))
+    index.save(path)
+
+    loaded = UserSimilarityIndex.load(path)
+    assert (loaded.similarity != index.similarity).nnz == 0
+    assert not loaded.refresh()
+
+    index.update(*random_ratings(rng, 30))
+    index.save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert loaded.refresh()
+    assert (loaded.similarity != index.similarity).nnz == 0